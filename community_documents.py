@@ -0,0 +1,106 @@
+import logging
+
+from graph_tools import clamp_limit, lucene_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_MEMBERS = 200
+MAX_REPORTS = 500
+INDEX_WAIT_SECONDS = 600
+
+DOCUMENT_PROPERTY = "search_document"
+DOCUMENT_INDEX = "community_document_fulltext"
+
+# Joins the non-null parts into one newline-separated string.
+_JOIN = (
+    "reduce(text = '', part IN [part IN parts WHERE part IS NOT NULL | toString(part)] | "
+    "text + CASE text WHEN '' THEN '' ELSE '\\n' END + part)"
+)
+
+# `coalesce([] + value, [])` accepts keywords/insights stored either as a
+# list or as a single string.
+SUBCOMMUNITY_DOCUMENTS_QUERY = f"""
+MATCH (s:SubCommunity)
+CALL {{
+  WITH s
+  OPTIONAL MATCH (e:Entity)-[:BELONGS_TO]->(s)
+  WITH s, collect(DISTINCT e.name)[..$max_members] AS members
+  WITH s, [s.comm_name, s.comm_description] + coalesce([] + s.keywords, []) + coalesce([] + s.insights, []) + members AS parts
+  SET s.{DOCUMENT_PROPERTY} = {_JOIN}
+}} IN TRANSACTIONS OF %d ROWS
+"""
+
+COMMUNITY_DOCUMENTS_QUERY = f"""
+MATCH (c:Community)
+CALL {{
+  WITH c
+  OPTIONAL MATCH (s:SubCommunity)-[:BELONGS_TO]->(c)
+  OPTIONAL MATCH (e:Entity)-[:BELONGS_TO]->(s)
+  WITH c, collect(DISTINCT s.comm_name) AS subcommunities, collect(DISTINCT e.name)[..$max_members] AS members
+  WITH c, [c.comm_name, c.comm_description] + subcommunities + members AS parts
+  SET c.{DOCUMENT_PROPERTY} = {_JOIN}
+}} IN TRANSACTIONS OF %d ROWS
+"""
+
+COMMUNITY_SEARCH_QUERY = f"""
+CALL db.index.fulltext.queryNodes('{DOCUMENT_INDEX}', $search, {{limit: $limit}}) YIELD node, score
+RETURN CASE WHEN node:SubCommunity THEN 'SubCommunity' ELSE 'Community' END AS label,
+       node.id AS id, node.comm_name AS name, node.comm_description AS text, score
+"""
+
+_REPORT_FIELDS = (
+    "node.id AS id, node.comm_name AS name, node.comm_description AS description, "
+    "node.insights AS insights, node.keywords AS keywords"
+)
+
+# Candidate community reports for global search, ranked by the document index.
+COMMUNITY_REPORTS_QUERY = f"""
+CALL db.index.fulltext.queryNodes('{DOCUMENT_INDEX}', $search, {{limit: $limit}}) YIELD node, score
+RETURN CASE WHEN node:SubCommunity THEN 'SubCommunity' ELSE 'Community' END AS label, {_REPORT_FIELDS}, score
+"""
+
+# The same reports by id, for candidates ranked some other way.
+REPORTS_BY_ID_QUERY = f"""
+UNWIND $ids AS report_id
+MATCH (node:SubCommunity {{id: report_id}})
+RETURN 'SubCommunity' AS label, {_REPORT_FIELDS}
+UNION ALL
+UNWIND $ids AS report_id
+MATCH (node:Community {{id: report_id}})
+RETURN 'Community' AS label, {_REPORT_FIELDS}
+"""
+
+
+def build_community_documents(driver, database=None, batch_size=DEFAULT_BATCH_SIZE, max_members=DEFAULT_MAX_MEMBERS):
+    # One search document per SubCommunity and Community: its names,
+    # description, keywords and insights plus the names of member Entities,
+    # behind a single full-text index over both labels. CALL ... IN
+    # TRANSACTIONS needs an auto-commit transaction, hence session.run.
+    with driver.session(database=database) as session:
+        for label, query in (("SubCommunity", SUBCOMMUNITY_DOCUMENTS_QUERY), ("Community", COMMUNITY_DOCUMENTS_QUERY)):
+            logger.info(f"Building {label} search documents")
+            counters = session.run(query % int(batch_size), max_members=max_members).consume().counters
+            logger.info(f"Wrote {counters.properties_set} {label} search documents")
+        logger.info(f"Creating full-text index {DOCUMENT_INDEX} on :Community|SubCommunity({DOCUMENT_PROPERTY})")
+        session.run(
+            f"CREATE FULLTEXT INDEX {DOCUMENT_INDEX} IF NOT EXISTS "
+            f"FOR (n:Community|SubCommunity) ON EACH [n.{DOCUMENT_PROPERTY}]"
+        ).consume()
+        session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+    logger.info("Community search documents are indexed")
+
+
+def community_search_statement(text, limit=None):
+    return COMMUNITY_SEARCH_QUERY, {"search": lucene_query(text), "limit": clamp_limit(limit)}
+
+
+def community_reports_statement(keywords, limit=None):
+    # Any keyword may match: Lucene ORs the terms by default, so reports
+    # matching more of them rank first.
+    search = " ".join(lucene_query(keyword) for keyword in keywords)
+    return COMMUNITY_REPORTS_QUERY, {"search": search, "limit": clamp_limit(limit, maximum=MAX_REPORTS)}
+
+
+def reports_by_id_statement(ids):
+    return REPORTS_BY_ID_QUERY, {"ids": list(dict.fromkeys(ids))[:MAX_REPORTS]}
@@ -0,0 +1,126 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+REJECT = "reject"
+REWRITE = "rewrite"
+
+DEFAULT_MAX_ESTIMATED_ROWS = 1_000_000
+DEFAULT_REWRITE_LIMIT = 100
+DEFAULT_EXPLAIN_TIMEOUT = 5.0
+
+RISKY_OPERATORS = {
+    "CartesianProduct": "cartesian product between disconnected patterns",
+    "AllNodesScan": "scan over every node in the graph (no label on a pattern)",
+    "NodeByLabelScan": "full label scan",
+}
+
+_UNBOUNDED_LENGTH = re.compile(r"\*\s*(?:\d*\s*\.\.\s*)?\]")
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+(?:\d+|\$\w+)\s*;?\s*$", re.IGNORECASE)
+_RETURN = re.compile(r"\bRETURN\b", re.IGNORECASE)
+_UNION = re.compile(r"\bUNION\b", re.IGNORECASE)
+
+
+def operator_name(plan):
+    return plan.get("operatorType", "").split("@")[0]
+
+
+def walk_plan(plan):
+    yield plan
+    for child in plan.get("children", []):
+        yield from walk_plan(child)
+
+
+def estimated_rows(plan):
+    return float(plan.get("args", {}).get("EstimatedRows", 0) or 0)
+
+
+class CostVerdict:
+    def __init__(self, query, rejected=False, rewritten=False, reasons=None, max_estimated_rows=0.0):
+        self.query = query
+        self.rejected = rejected
+        self.rewritten = rewritten
+        self.reasons = reasons or []
+        self.max_estimated_rows = max_estimated_rows
+
+    def response(self):
+        return {
+            "rejected": True,
+            "estimated_rows": int(self.max_estimated_rows),
+            "reasons": self.reasons,
+            "suggestion": (
+                "The query was not executed. Anchor every pattern on a labelled node with a "
+                "property filter, connect the patterns, bound variable-length relationships "
+                "(e.g. *1..3) and add a LIMIT."
+            ),
+        }
+
+    def note(self):
+        return {
+            "rewritten_query": self.query,
+            "reasons": self.reasons,
+        }
+
+
+class CostGuard:
+    # Runs EXPLAIN on model-written Cypher and rejects (or bounds with a
+    # LIMIT) queries whose plan is too expensive to run on the shared graph.
+    def __init__(self, max_estimated_rows=DEFAULT_MAX_ESTIMATED_ROWS, action=REWRITE,
+                 rewrite_limit=DEFAULT_REWRITE_LIMIT, explain_timeout=DEFAULT_EXPLAIN_TIMEOUT):
+        self.max_estimated_rows = max_estimated_rows
+        self.action = action
+        self.rewrite_limit = rewrite_limit
+        self.explain_timeout = explain_timeout
+
+    def evaluate(self, query, plan):
+        reasons = []
+        peak = 0.0
+        unbounded = bool(_UNBOUNDED_LENGTH.search(query))
+
+        for operator in walk_plan(plan or {}):
+            name = operator_name(operator)
+            rows = estimated_rows(operator)
+            peak = max(peak, rows)
+            details = str(operator.get("args", {}).get("Details", ""))
+            if name.startswith("VarLengthExpand") and _UNBOUNDED_LENGTH.search(details):
+                unbounded = True
+            if name in RISKY_OPERATORS and rows > self.max_estimated_rows:
+                reasons.append(f"{RISKY_OPERATORS[name]} ({name}, ~{int(rows)} rows)")
+
+        if unbounded:
+            reasons.append("unbounded variable-length relationship pattern")
+        over_budget = peak > self.max_estimated_rows
+        if over_budget:
+            reasons.append(f"estimated {int(peak)} rows exceeds the limit of {int(self.max_estimated_rows)}")
+
+        return CostVerdict(query, rejected=bool(unbounded or over_budget), reasons=reasons, max_estimated_rows=peak)
+
+    def limited(self, query):
+        # Only a single trailing RETURN without its own LIMIT can be bounded
+        # safely by appending one.
+        text = query.strip().rstrip(";")
+        if self.action != REWRITE or _UNION.search(text) or _TRAILING_LIMIT.search(text) or not _RETURN.search(text):
+            return None
+        return f"{text}\nLIMIT {int(self.rewrite_limit)}"
+
+    async def decide(self, query, explain):
+        verdict = self.evaluate(query, await explain(query))
+        if not verdict.rejected:
+            return verdict
+
+        unbounded = _UNBOUNDED_LENGTH.search(query)
+        rewritten = None if unbounded else self.limited(query)
+        if rewritten is not None:
+            retry = self.evaluate(rewritten, await explain(rewritten))
+            if not retry.rejected:
+                logger.info(f"Cost guard bounded query with LIMIT {self.rewrite_limit}")
+                retry.rewritten = True
+                retry.reasons = verdict.reasons
+                return retry
+
+        logger.warning(f"Cost guard rejected query: {verdict.reasons}")
+        return verdict
+
+    def cache_key(self):
+        return (self.max_estimated_rows, self.action, self.rewrite_limit)
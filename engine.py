@@ -0,0 +1,1160 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+
+import google.genai as genai
+from google.genai.types import FunctionDeclaration, GenerateContentConfig, Part, Tool
+
+from community_documents import (
+    DOCUMENT_INDEX,
+    community_reports_statement,
+    community_search_statement,
+    reports_by_id_statement,
+)
+from cost_guard import DEFAULT_MAX_ESTIMATED_ROWS, DEFAULT_REWRITE_LIMIT, REWRITE, CostGuard
+from entity_cards import ENTITY_INDEXES, MAX_CARD_KEYS, card_lookup_statement, cards_from_rows
+from entity_resolver import (
+    DEFAULT_RESOLVE_LIMIT,
+    MAX_RESOLVE_LIMIT,
+    ensure_entity_resolver,
+    get_entity_resolver,
+    refresh_entity_resolver,
+)
+from global_search import (
+    DEFAULT_CANDIDATES,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAP_INPUT_TOKENS,
+    DEFAULT_MAP_OUTPUT_TOKENS,
+    DEFAULT_REDUCE_INPUT_TOKENS,
+    DEFAULT_REDUCE_OUTPUT_TOKENS,
+    DEFAULT_REPORT_TOKENS,
+    GLOBAL,
+    LOCAL,
+    MODES,
+    GlobalSearch,
+)
+from graph_tools import (
+    DEFAULT_ENTITIES_PER_SOURCE,
+    DEFAULT_MAX_EXPANDED_ENTITIES,
+    DEFAULT_MAX_RELATIONSHIPS,
+    DEFAULT_SEARCH_LIMIT,
+    FULLTEXT_INDEXES,
+    MAX_ENTITIES_PER_SOURCE,
+    MAX_SEARCH_LIMIT,
+    clamp_limit,
+    covering_keywords,
+    expand_neighborhood_statement,
+    fulltext_search_statement,
+    keyword_search_statement,
+    merge_keyword_hits,
+)
+from hybrid_search import DEFAULT_ALPHA, HASHING, ensure_hybrid_index, get_hybrid_index
+from neo4j_client import (
+    DEFAULT_MAX_ROWS_COUNTED,
+    QueryOptions,
+    clear_online_indexes,
+    get_async_driver,
+    get_driver,
+    get_online_indexes,
+    new_async_bookmark_manager,
+    run_cypher_batch_async,
+    run_cypher_query_async,
+)
+from projection import DEFAULT_MAX_STRING_LENGTH, PropertyProjection
+from query_cache import DEFAULT_MAX_BYTES, DEFAULT_TTL_SECONDS, get_plan_tracker, get_query_cache
+from result_format import MINIFIED, encode_results
+from search_index import (
+    ensure_search_index,
+    ensure_term_statistics,
+    get_search_index,
+    reload_search_index,
+    reload_term_statistics,
+)
+from text_analysis import decompose, expand_terms, fold, terms
+from type_index import (
+    DEFAULT_MAX_AGE_SECONDS,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    ensure_type_index,
+    get_type_index,
+    reload_type_index,
+)
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash"
+
+DEFAULT_ENGINE_OPTIONS = {
+    "model": MODEL_NAME,
+    "database": None,
+    "temperature": 0.0,
+    "answer_mode": LOCAL,
+    "max_concurrent_tool_calls": 4,
+    "cypher_batch_enabled": True,
+    "max_batch_queries": 20,
+    "result_format": MINIFIED,
+    "max_result_rows": 200,
+    "max_result_rows_counted": DEFAULT_MAX_ROWS_COUNTED,
+    "max_result_bytes": 256 * 1024,
+    "projection_allow": {},
+    "projection_deny": None,
+    "max_string_length": DEFAULT_MAX_STRING_LENGTH,
+    "tool_query_timeout": 20.0,
+    "cost_guard_enabled": True,
+    "cost_guard_max_estimated_rows": float(DEFAULT_MAX_ESTIMATED_ROWS),
+    "cost_guard_action": REWRITE,
+    "cost_guard_rewrite_limit": DEFAULT_REWRITE_LIMIT,
+    "cache_enabled": True,
+    "cache_ttl_seconds": DEFAULT_TTL_SECONDS,
+    "cache_max_bytes": DEFAULT_MAX_BYTES,
+    "keyword_search_enabled": True,
+    "normalized_search_enabled": False,
+    "pre_retrieval_enabled": True,
+    "pre_retrieval_limit": DEFAULT_SEARCH_LIMIT,
+    "term_statistics_enabled": True,
+    "fulltext_search_enabled": True,
+    "community_search_enabled": True,
+    "inverted_index_enabled": False,
+    "inverted_index_snapshot": "",
+    "expand_neighborhood_enabled": True,
+    "max_expanded_relationships": DEFAULT_MAX_RELATIONSHIPS,
+    "max_expanded_entities": DEFAULT_MAX_EXPANDED_ENTITIES,
+    "entity_cards_enabled": True,
+    "entity_resolver_enabled": True,
+    "type_index_enabled": True,
+    "type_index_max_age_seconds": DEFAULT_MAX_AGE_SECONDS,
+    "hybrid_search_enabled": False,
+    "embedding_model": HASHING,
+    "hybrid_alpha": DEFAULT_ALPHA,
+    "global_search_candidates": DEFAULT_CANDIDATES,
+    "global_search_concurrency": DEFAULT_CONCURRENCY,
+    "global_search_report_tokens": DEFAULT_REPORT_TOKENS,
+    "global_search_map_input_tokens": DEFAULT_MAP_INPUT_TOKENS,
+    "global_search_map_output_tokens": DEFAULT_MAP_OUTPUT_TOKENS,
+    "global_search_reduce_input_tokens": DEFAULT_REDUCE_INPUT_TOKENS,
+    "global_search_reduce_output_tokens": DEFAULT_REDUCE_OUTPUT_TOKENS,
+}
+
+run_query = FunctionDeclaration(
+    name="run_cypher_query",
+    description="Run a Cypher query against the Neo4j database.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "The Cypher query to run. Reference values as $parameters instead of inlining literals.",
+            },
+            "params": {
+                "type": "string",
+                "description": "JSON object with the values for the query's $parameters, e.g. {\"keyword\": \"quotation\"}.",
+            },
+        },
+        "required": ["query"],
+    },
+)
+
+run_cypher_batch = FunctionDeclaration(
+    name="run_cypher_batch",
+    description=(
+        "Run several independent read-only Cypher queries in one database transaction. Returns one entry per "
+        "query, in order, each with its own results or error; a failing query does not affect the others."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "queries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "A Cypher query using $parameters."},
+                        "params": {"type": "string", "description": "JSON object with the query's parameter values."},
+                    },
+                    "required": ["query"],
+                },
+                "description": "The queries to run.",
+            },
+        },
+        "required": ["queries"],
+    },
+)
+
+search_knowledge_graph = FunctionDeclaration(
+    name="search_knowledge_graph",
+    description=(
+        "CONTAINS search for one keyword across all seven Step 1 fields (Chunk.summary, "
+        "Community.comm_name/comm_description, SubCommunity.comm_name/comm_description/keywords/insights) "
+        "in a single query. Returns one labeled hit per matching node with the fields it matched in."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "keyword": {
+                "type": "string",
+                "description": "A single atomic keyword, e.g. \"quotation\".",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of hits (default {DEFAULT_SEARCH_LIMIT}, at most {MAX_SEARCH_LIMIT}).",
+            },
+        },
+        "required": ["keyword"],
+    },
+)
+
+search_fulltext = FunctionDeclaration(
+    name="search_fulltext",
+    description=(
+        "Keyword search over Chunk.summary, Community.comm_name/comm_description and "
+        "SubCommunity.comm_name/comm_description/keywords/insights using full-text indexes. "
+        "Returns hits ranked by relevance score."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "One or more plain keywords, e.g. \"quotation\" or \"claim rights\".",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of hits (default {DEFAULT_SEARCH_LIMIT}, at most {MAX_SEARCH_LIMIT}).",
+            },
+        },
+        "required": ["query"],
+    },
+)
+
+search_local_index = FunctionDeclaration(
+    name="search_local_index",
+    description=(
+        "Instant in-memory keyword search over Chunk summaries and Community/SubCommunity text "
+        "(names, descriptions, keywords, insights). Returns label, id, name, a snippet and a score."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "One or more keywords; word endings are ignored (claim matches claimed/claims).",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of hits (default {DEFAULT_SEARCH_LIMIT}, at most {MAX_SEARCH_LIMIT}).",
+            },
+        },
+        "required": ["query"],
+    },
+)
+
+hybrid_search = FunctionDeclaration(
+    name="hybrid_search",
+    description=(
+        "Ranked search over Chunk summaries and Community/SubCommunity text that combines keyword "
+        "(BM25) and embedding similarity; common synonyms (supplier/vendor, issue/problem) are matched too. "
+        "Returns label, id, name, snippet and fused/keyword/vector scores."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "The user's question or a short description of what to find; no need to split it into keywords.",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of hits (default {DEFAULT_SEARCH_LIMIT}, at most {MAX_SEARCH_LIMIT}).",
+            },
+        },
+        "required": ["query"],
+    },
+)
+
+expand_neighborhood = FunctionDeclaration(
+    name="expand_neighborhood",
+    description=(
+        "Step 2 local search for many seeds at once: given Chunk, Community and SubCommunity ids, returns one "
+        "row per relationship between their linked Entities (kind \"relationship\", with relationship_description), "
+        "then one row per linked Entity (kind \"entity\": id, name, description, which seed ids it came from), "
+        "most shared first, all in one query."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "ids": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Ids of the Chunk, Community and SubCommunity nodes found in Step 1.",
+            },
+            "max_entities": {
+                "type": "integer",
+                "description": f"Maximum Entities per seed id (default {DEFAULT_ENTITIES_PER_SOURCE}, at most {MAX_ENTITIES_PER_SOURCE}).",
+            },
+            "rel_types": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Only return relationships of these types, e.g. [\"VENDOR\", \"SOURCESFROM\"]. Omit for all types.",
+            },
+        },
+        "required": ["ids"],
+    },
+)
+
+get_entity_cards = FunctionDeclaration(
+    name="get_entity_cards",
+    description=(
+        "Precomputed cards for Entities, looked up by name or id. Each card holds the entity_description, its "
+        "EntityTypes, its top relationships with relationship_description, its parent SubCommunity and Community "
+        "names and the ids of Chunks mentioning it."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "names_or_ids": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": f"Exact Entity names (e.g. \"Zenith Textiles\") or ids, at most {MAX_CARD_KEYS}.",
+            },
+        },
+        "required": ["names_or_ids"],
+    },
+)
+
+resolve_entity = FunctionDeclaration(
+    name="resolve_entity",
+    description=(
+        "Fuzzy lookup of Entity names, tolerant of misspellings, case and accents (e.g. \"luis vitton\" finds "
+        "\"Louis Vuitton\"). Returns the closest Entities with id, exact name and a similarity score in [0, 1]."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "text": {
+                "type": "string",
+                "description": "A vendor, brand, person or other entity name as written in the question.",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of candidates (default {DEFAULT_RESOLVE_LIMIT}, at most {MAX_RESOLVE_LIMIT}).",
+            },
+        },
+        "required": ["text"],
+    },
+)
+
+list_entities_by_type = FunctionDeclaration(
+    name="list_entities_by_type",
+    description=(
+        "Step 3 lookup: the Entities linked to an EntityType through RELATED_TO, with id, name and a short "
+        "description, one page at a time, served from memory. Call it without entity_type to list the types "
+        "and their sizes."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "entity_type": {
+                "type": "string",
+                "description": "An entity type, e.g. \"Person\" or \"Brand\" (case-insensitive).",
+            },
+            "offset": {
+                "type": "integer",
+                "description": "Position of the first Entity to return; pass next_offset from the previous page.",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Entities per page (default {DEFAULT_PAGE_SIZE}, at most {MAX_PAGE_SIZE}).",
+            },
+        },
+    },
+)
+
+search_communities = FunctionDeclaration(
+    name="search_communities",
+    description=(
+        "One indexed search over a combined document per Community and SubCommunity: name, description, "
+        "keywords, insights and the names of member Entities. Returns label, id, name, description and a "
+        "relevance score. Best for community-level questions (themes, segments, which community covers X)."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Plain keywords or entity names, e.g. \"leather supply risk\".",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of hits (default {DEFAULT_SEARCH_LIMIT}, at most {MAX_SEARCH_LIMIT}).",
+            },
+        },
+        "required": ["query"],
+    },
+)
+
+# Extra tools, each behind an `<name>_enabled`-style engine option, with the
+# note appended to the system prompt when the tool is offered.
+OPTIONAL_TOOLS = {
+    "run_cypher_batch": ("cypher_batch_enabled", run_cypher_batch, """
+run_cypher_batch: when you have several small queries ready at once (e.g. one per id or per keyword), send them in one run_cypher_batch call instead of separate run_cypher_query calls.
+"""),
+    "search_knowledge_graph": ("keyword_search_enabled", search_knowledge_graph, """
+search_knowledge_graph: exact Step 1 search. One call runs the CONTAINS search for one keyword over all seven fields and returns label, id, name, text and matched_fields. Prefer it to writing one CONTAINS query per field or label.
+"""),
+    "search_fulltext": ("fulltext_search_enabled", search_fulltext, """
+search_fulltext: ranked Step 1 search. One call matches several keywords at once (any word order, word forms) over the same fields through full-text indexes and returns label, id, name, text and a relevance score; the same search-iteratively rules apply. Use it for multi-word topics; use an exact CONTAINS search when a substring must match literally.
+"""),
+    "search_local_index": ("inverted_index_enabled", search_local_index, """
+search_local_index: answers Step 1 keyword lookups from an in-memory index without querying the database. Pass the keywords as one string; hits come back ranked with label, id, name and a snippet. Use the returned ids for Step 2.
+"""),
+    "search_communities": ("community_search_enabled", search_communities, """
+search_communities: community lookup. One call ranks the Communities and SubCommunities whose name, description, keywords, insights or member Entity names match the text. Use it to find which communities a topic or Entity belongs to; it does not search Chunk summaries.
+"""),
+    "expand_neighborhood": ("expand_neighborhood_enabled", expand_neighborhood, """
+expand_neighborhood: do Step 2 with a single call passing all ids found in Step 1, instead of one query per id. Pass rel_types to keep only the relationship types that matter for the question.
+"""),
+    "get_entity_cards": ("entity_cards_enabled", get_entity_cards, """
+get_entity_cards: when you know Entity names or ids, one call returns everything Step 2 would collect about them. Write Step 2 queries only for Entities listed as missing.
+"""),
+    "resolve_entity": ("entity_resolver_enabled", resolve_entity, """
+resolve_entity: when the question names a vendor, brand or person, resolve it to exact Entity names first instead of retrying CONTAINS searches with spelling variants.
+"""),
+    "list_entities_by_type": ("type_index_enabled", list_entities_by_type, """
+list_entities_by_type: use it for Step 3 instead of traversing EntityType-RELATED_TO-Entity with a query. Page with next_offset only while more entities are needed.
+"""),
+    "hybrid_search": ("hybrid_search_enabled", hybrid_search, """
+hybrid_search: use it first in Step 1 when the question's wording may differ from the graph's (e.g. synonyms). It ranks by keyword and embedding similarity; follow up with keyword searches for exact terms.
+"""),
+}
+
+# Indexes built by maintenance.py jobs that a tool cannot work without; the
+# tool is only offered while all of them are ONLINE.
+TOOL_INDEXES = {
+    "search_fulltext": [name for name, _, _ in FULLTEXT_INDEXES],
+    "search_communities": [DOCUMENT_INDEX],
+    # Created by the entity-cards job together with the cards.
+    "get_entity_cards": [name for name, _ in ENTITY_INDEXES],
+}
+
+SYSTEM_PROMPT = """
+# Objective:
+Query a Neo4j Knowledge Graph to extract, analyze, and synthesize answers strictly based on graph database (referred as Knowledge graph).
+
+# Graph Structure
+Nodes: Community, SubCommunity, Entity, Chunk (referred as Document Data of Knowledge graph), EntityType
+Subcommunity -> Community  has "BELONGS_TO"
+Entity -> SubCommunity has "BELONGS_TO"
+Chunk -> Entity has "RELATED_TO"
+EntityType -> Entity has "RELATED_TO"
+Available entity types - ("HS Code"/"Organization"/"Business Model"/"Industry"/"Product Category"/"Business Process"/"Geographic Region"/"Brand"/"Product"/"Platform"/"Communication Channel"/"Business Metric"/"Person"/"Location"/"Event")
+Relationships: "BELONGS_TO"/"OPERATES"/"OWNS"/"RELATED_TO"/"RELATEDTO"/"MANAGES"/"USES"/"MONITORS"/"COVERS"/"SPANS"/"SOURCESFROM"/"CONTAINS"/"VENDOR"/"ALTERNATEVENDORLOCATION"/"SUBJECTTO"/"HASHSCODE"/"REQUIRES"/"BRAND"/"COMPOSEDOF"
+
+# Workflow
+Step 1: Global Search — Decompose and Search Intelligently
+Break down the user query into individual, atomic keywords.
+Example: "claimed rights and quotation" → ["claim", "claimed", "quote", "quotation", "rights"].
+Search iteratively:
+DO NOT search using all keywords at once.
+Start with the most meaningful/central keyword first.
+Perform a CONTAINS search over the following fields:
+Chunk.summary
+Community.comm_name
+Community.comm_description
+Subcommunity.comm_name
+Subcommunity.comm_description
+Subcommunity.keywords
+Subcommunity.insights
+Always pass the keyword as a query parameter instead of writing it into the query text, so the same query is reused for every keyword:
+run_cypher_query(query="MATCH (c:Chunk) WHERE c.summary CONTAINS $keyword RETURN c.id, c.summary", params="{\"keyword\": \"quotation\"}")
+Important:
+After searching with a keyword, analyze the results.
+If the results are sufficient for understanding, immediately proceed to Step 2.
+Only if the information is insufficient, then pick the next most relevant keyword and search again.
+Stop as soon as useful data is found. Do not exhaustively search all keywords.
+
+Step 2: Local Search — Expand via Related Entities
+For each matched Chunk, Community, or Subcommunity:
+Retrieve linked Entities through the BELONGS_TO relationship using **IDs** (Chunk.id, Community.id etc) of matched Chunk, Community, or Subcommunity.
+For each retrieved Entity:
+Extract:
+Entity descriptions(entity_description) and Relationship(relationship_description) descriptions between them
+Goal:
+Understand how different Chunks/Communities/Subcommunities are interconnected via Entities.
+Entities can appear across multiple parts of the graph and create deeper insights.
+
+Step 3 (Optional): Global Search — Leverage Entity Types if Needed
+If required information is still missing, then:
+Explore connected Entity Types through the RELATED_TO relationship.
+Example: if you need all "PERSON" nodes linked to the context.
+Only perform this step if a specific type of entity needs to be searched across the graph.
+
+Step 4: Synthesize the Answer
+Merge:
+Chunk text
+Entity facts
+Entity relationship facts
+SubCommunity insights
+Entity types (if explored)
+Then synthesize a coherent, complete answer based on all collected data.
+
+# Response Rules
+**Only the final synthesized response must be in bold.**
+*All intermediate notes must be italicized.*
+Always conclude with a positive or forward-looking remark.
+If you are performing global search, output it as "Performing Global Search..." else "Performing Local Search" or "performing Optional Global Search" and so on
+Do not include use term - chunk , use document Database.
+
+# Strict Rules
+YOu need to perform both global and local search compulsarily.
+Refer Graph as Knowledgr graph and chunk as document database
+No combining keywords unless individually searched.
+No cross-node assumptions unless supported by explicit relations.
+No invented or assumed facts — only synthesize from observed graph patterns.
+Never include any IDs in your response, Just output without any specification of them. Ex : "I found it in a document database"
+
+Example Workflows
+Service Availability:
+Break into keywords → Search Chunks → Find Entities → Extract OFFEREDBY links → Gather SubCommunity/Community insights → Synthesize.
+
+Claims Resolution:
+Break into claims, underserved → Search Chunks → Extract Entities → Trace claim-processing relationships → Contextualize via Communities → Synthesize.
+"""
+
+# Schema hint appended once `python maintenance.py shadow-properties` has run
+# and normalized_search_enabled is set.
+NORMALIZED_FIELDS_NOTE = """
+# Case-insensitive search
+Every Step 1 field has a lowercased, accent-folded, whitespace-collapsed copy with an "_norm" suffix, backed by a text index: Chunk.summary_norm, Community.comm_name_norm, Community.comm_description_norm, Subcommunity.comm_name_norm, Subcommunity.comm_description_norm, Subcommunity.keywords_norm, Subcommunity.insights_norm (keywords_norm and insights_norm are single strings).
+For case-insensitive CONTAINS searches use these with a lowercase, accent-free keyword, e.g. run_cypher_query(query="MATCH (c:Chunk) WHERE c.summary_norm CONTAINS $keyword RETURN c.id, c.summary", params="{\"keyword\": \"quotation\"}"). Never wrap a property in toLower().
+"""
+
+# First message when the Step 1 keyword searches were already run locally.
+PRE_RETRIEVAL_MESSAGE = """{user_query}
+
+# Step 1 results
+The Step 1 keyword searches were already run for: {keywords}.
+Merged matches, best first (label, id, name, text, matched_keywords, matched_fields):
+{hits}
+{missing}Use these ids for Step 2. Search Step 1 again only with keywords not listed above, or if these matches are insufficient.
+"""
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+_engine_loop = None
+_engine_loop_lock = threading.Lock()
+
+
+def engine_options(**overrides):
+    options = dict(DEFAULT_ENGINE_OPTIONS)
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def get_genai_client(google_api_key):
+    with _clients_lock:
+        client = _clients.get(google_api_key)
+        if client is None:
+            logger.info("Initializing Google AI client")
+            client = genai.Client(api_key=google_api_key)
+            _clients[google_api_key] = client
+    return client
+
+
+def get_engine_loop():
+    # A single background event loop serves every question in the process, so
+    # synchronous front ends like Streamlit share one async driver and one set
+    # of HTTP connections instead of spinning up a loop per request.
+    global _engine_loop
+    with _engine_loop_lock:
+        if _engine_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="graphrag-engine", daemon=True)
+            thread.start()
+            _engine_loop = loop
+    return _engine_loop
+
+
+async def _close_quietly(async_iterator):
+    try:
+        await async_iterator.aclose()
+    except Exception as e:
+        logger.debug(f"Ignoring error while closing abandoned question: {e}")
+
+
+def iterate_sync(async_iterator, on_idle=None, poll_interval=0.5):
+    # on_idle is called every poll_interval while waiting, giving the caller a
+    # chance to bail out (Streamlit raises its rerun/stop exceptions from UI
+    # calls). If the consumer stops early for any reason, the in-flight step
+    # is cancelled so its Neo4j transactions and Gemini requests are abandoned.
+    loop = get_engine_loop()
+    future = None
+    try:
+        while True:
+            future = asyncio.run_coroutine_threadsafe(async_iterator.__anext__(), loop)
+            while True:
+                try:
+                    item = future.result(timeout=poll_interval if on_idle else None)
+                    break
+                except concurrent.futures.TimeoutError:
+                    on_idle()
+            yield item
+    except StopAsyncIteration:
+        return
+    finally:
+        if future is not None and not future.done():
+            logger.info("Abandoning in-flight question")
+            future.cancel()
+        asyncio.run_coroutine_threadsafe(_close_quietly(async_iterator), loop)
+
+
+def parse_params(params):
+    # Tool params arrive as a JSON string (or, from some clients, already a
+    # dict). Returns (params, error message).
+    params = params or {}
+    if isinstance(params, str):
+        try:
+            params = json.loads(params) if params.strip() else {}
+        except ValueError as e:
+            return None, f"'params' is not valid JSON: {e}"
+    if not isinstance(params, dict):
+        return None, "'params' must be a JSON object mapping parameter names to values."
+    return params, None
+
+
+def response_text(response):
+    return "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, "text") and part.text)
+
+
+def has_parts(response):
+    return hasattr(response, "candidates") and response.candidates and response.candidates[0].content.parts
+
+
+class QuestionContext:
+    # Per-question state shared by every tool call made while answering it.
+    def __init__(self, user_query):
+        self.user_query = user_query
+        self.bookmark_manager = new_async_bookmark_manager()
+
+
+class GraphRAGEngine:
+    def __init__(self, neo4j_uri, neo4j_user, neo4j_password, google_api_key, pool_settings=None, **options):
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_user = neo4j_user
+        self.neo4j_password = neo4j_password
+        self.google_api_key = google_api_key
+        self.pool_settings = pool_settings or {}
+        self.options = engine_options(**options)
+        guard = None
+        if self.options["cost_guard_enabled"]:
+            guard = CostGuard(
+                max_estimated_rows=self.options["cost_guard_max_estimated_rows"],
+                action=self.options["cost_guard_action"],
+                rewrite_limit=self.options["cost_guard_rewrite_limit"]
+            )
+        self.query_options = QueryOptions(
+            result_format=self.options["result_format"],
+            max_rows=self.options["max_result_rows"],
+            max_bytes=self.options["max_result_bytes"],
+            max_rows_counted=self.options["max_result_rows_counted"],
+            projection=PropertyProjection(
+                allow=self.options["projection_allow"],
+                deny=self.options["projection_deny"],
+                max_string_length=self.options["max_string_length"]
+            ),
+            timeout=self.options["tool_query_timeout"],
+            guard=guard,
+            plan_tracker=get_plan_tracker()
+        )
+        self.trusted_query_options = self.query_options.trusted()
+        # Pre-retrieval merges rows in Python, so it always reads them as
+        # plain JSON-compatible lists.
+        self.retrieval_query_options = self.query_options.trusted()
+        self.retrieval_query_options.result_format = MINIFIED
+        # Cards are stored as JSON strings, which string truncation would
+        # break; they are projected after parsing instead.
+        self.card_query_options = self.query_options.trusted()
+        self.card_query_options.result_format = MINIFIED
+        self.card_query_options.projection = None
+        # expand_neighborhood bounds its own rows, so its budget is sized to
+        # fit every entity and relationship row it can return.
+        self.expand_query_options = self.query_options.trusted()
+        self.expand_query_options.max_rows = (
+            self.options["max_expanded_entities"] + self.options["max_expanded_relationships"]
+        )
+        self.cache = None
+        if self.options["cache_enabled"]:
+            self.cache = get_query_cache(self.options["cache_ttl_seconds"], self.options["cache_max_bytes"])
+
+        if self.options["inverted_index_enabled"] or self.options["hybrid_search_enabled"]:
+            index = ensure_search_index(
+                self.sync_driver(),
+                self.options["database"],
+                self.options["inverted_index_snapshot"] or None
+            )
+            if self.options["hybrid_search_enabled"]:
+                ensure_hybrid_index(index, self.options["embedding_model"], self.options["hybrid_alpha"])
+
+        self.tools = {"run_cypher_query": self.tool_run_cypher_query}
+        declarations = [run_query]
+        tool_notes = []
+        for name, (option, declaration, note) in OPTIONAL_TOOLS.items():
+            if self.options[option] and self.indexes_online(name):
+                self.tools[name] = getattr(self, f"tool_{name}")
+                declarations.append(declaration)
+                tool_notes.append(note.strip())
+        self.data_tool = Tool(function_declarations=declarations)
+        self.system_prompt = SYSTEM_PROMPT
+        if self.options["normalized_search_enabled"]:
+            self.system_prompt += NORMALIZED_FIELDS_NOTE
+        if tool_notes:
+            self.system_prompt += "\n# Tools\n" + "\n".join(tool_notes) + "\n"
+
+    def driver(self):
+        return get_async_driver(self.neo4j_uri, self.neo4j_user, self.neo4j_password, **self.pool_settings)
+
+    def sync_driver(self):
+        return get_driver(self.neo4j_uri, self.neo4j_user, self.neo4j_password, **self.pool_settings)
+
+    def indexes_online(self, tool_name):
+        required = TOOL_INDEXES.get(tool_name)
+        if not required:
+            return True
+        try:
+            online = get_online_indexes(self.sync_driver(), self.options["database"])
+        except Exception as e:
+            logger.warning(f"Could not check the indexes {tool_name} needs, not offering it: {e}")
+            return False
+        missing = [name for name in required if name not in online]
+        if missing:
+            logger.info(f"Not offering {tool_name}: indexes {missing} are not ONLINE (see maintenance.py)")
+        return not missing
+
+    def refresh_graph_caches(self):
+        # Call after a batch load: drops cached results and rebuilds the
+        # in-process indexes from the refreshed graph.
+        if self.cache is not None:
+            self.cache.clear()
+        clear_online_indexes()
+        if self.options["inverted_index_enabled"] or self.options["hybrid_search_enabled"]:
+            index = reload_search_index(
+                self.sync_driver(),
+                self.options["database"],
+                self.options["inverted_index_snapshot"] or None
+            )
+            if self.options["hybrid_search_enabled"]:
+                ensure_hybrid_index(index, self.options["embedding_model"], self.options["hybrid_alpha"])
+        if self.options["term_statistics_enabled"]:
+            reload_term_statistics(self.sync_driver(), self.options["database"])
+        if self.options["entity_resolver_enabled"]:
+            refresh_entity_resolver(self.sync_driver(), self.options["database"])
+        if self.options["type_index_enabled"] and get_type_index() is not None:
+            reload_type_index(self.sync_driver(), self.options["database"])
+
+    def weigh_keywords(self, expanded):
+        # {term: keywords} -> (surviving {term: keywords}, term weights,
+        # dropped words). Building the statistics and the substring fallback
+        # of keyword_frequency are CPU-bound, so this runs in a worker thread.
+        statistics = ensure_term_statistics(self.sync_driver(), self.options["database"])
+        kept = {}
+        weights = {}
+        missing = []
+        for term, keywords in expanded.items():
+            found = [keyword for keyword in keywords if statistics.keyword_frequency(keyword)]
+            if not found:
+                missing.append(keywords[0])
+                continue
+            kept[term] = found
+            weights[term] = max(statistics.idf(keyword_term) for keyword in found for keyword_term in terms(keyword))
+        return kept, weights, missing
+
+    async def pruned_terms(self, user_query):
+        # Statistics are built on first use rather than in __init__, so a
+        # question can still be answered (without pruning) while Neo4j is
+        # unreachable.
+        expanded = expand_terms(user_query)
+        if not self.options["term_statistics_enabled"]:
+            return expanded, {}, []
+        try:
+            return await asyncio.to_thread(self.weigh_keywords, expanded)
+        except Exception as e:
+            logger.warning(f"Term statistics unavailable, keywords will not be pruned: {e}")
+            return expanded, {}, []
+
+    async def run_query(self, query, context, params=None, trusted=False, options=None):
+        if options is None:
+            options = self.trusted_query_options if trusted else self.query_options
+        return await run_cypher_query_async(
+            query,
+            self.driver(),
+            database=self.options["database"],
+            bookmark_manager=context.bookmark_manager,
+            cache=self.cache,
+            options=options,
+            params=params
+        )
+
+    async def pre_retrieve(self, user_query, context):
+        # Step 1 without the model: the question is decomposed locally and
+        # every keyword is searched at once, instead of one model turn per
+        # keyword. With term statistics, keywords no indexed term contains
+        # are dropped before any query and the rest run rarest term first.
+        # Returns the keywords searched, the merged hits and the words that
+        # were dropped.
+        expanded, weights, missing = await self.pruned_terms(user_query)
+        searches = []
+        for term, keywords in expanded.items():
+            if self.options["normalized_search_enabled"]:
+                # Case variants collapse into one folded keyword.
+                keywords = list(dict.fromkeys(fold(keyword) for keyword in keywords))
+            searches.extend((term, keyword) for keyword in covering_keywords(keywords))
+        searches.sort(key=lambda search: -weights.get(search[0], 0.0))
+        semaphore = asyncio.Semaphore(max(1, self.options["max_concurrent_tool_calls"]))
+
+        async def search(keyword):
+            query, params = keyword_search_statement(
+                keyword,
+                self.options["pre_retrieval_limit"],
+                self.options["normalized_search_enabled"]
+            )
+            async with semaphore:
+                data = await self.run_query(query, context, params=params, options=self.retrieval_query_options)
+            if "error" in data:
+                logger.warning(f"Pre-retrieval search for {keyword!r} failed: {data['error']}")
+            return data.get("results") or []
+
+        results = await asyncio.gather(*(search(keyword) for _, keyword in searches))
+        hits = merge_keyword_hits(
+            [(term, keyword, rows) for (term, keyword), rows in zip(searches, results)],
+            self.options["pre_retrieval_limit"],
+            weights
+        )
+        logger.info(f"Pre-retrieval searched {len(searches)} keywords, {len(hits)} merged hits, pruned {missing}")
+        return [keyword for _, keyword in searches], hits, missing
+
+    async def tool_run_cypher_query(self, args, context):
+        if "query" not in args:
+            return None
+        params, error = parse_params(args.get("params"))
+        if error:
+            return {"error": error}
+        return await self.run_query(args["query"], context, params=params)
+
+    async def tool_run_cypher_batch(self, args, context):
+        queries = args.get("queries") or []
+        if not isinstance(queries, list):
+            return {"error": "'queries' must be a list of {\"query\": ..., \"params\": ...} objects."}
+        if not queries:
+            return {"error": "run_cypher_batch needs at least one entry in 'queries'."}
+        if len(queries) > self.options["max_batch_queries"]:
+            return {"error": f"run_cypher_batch accepts at most {self.options['max_batch_queries']} queries per call."}
+
+        responses = [None] * len(queries)
+        statements = []
+        positions = []
+        for position, item in enumerate(queries):
+            if not isinstance(item, dict):
+                responses[position] = {"error": "Each entry must be an object with 'query' and optional 'params'."}
+                continue
+            query = str(item.get("query", "")).strip()
+            params, error = parse_params(item.get("params"))
+            if not query:
+                error = "Empty 'query'."
+            if error:
+                responses[position] = {"error": error}
+            else:
+                statements.append((query, params))
+                positions.append(position)
+
+        if statements:
+            results = await run_cypher_batch_async(
+                statements,
+                self.driver(),
+                database=self.options["database"],
+                bookmark_manager=context.bookmark_manager,
+                cache=self.cache,
+                options=self.query_options
+            )
+            for position, result in zip(positions, results):
+                responses[position] = result
+        return {"results": responses}
+
+    async def tool_search_knowledge_graph(self, args, context):
+        if not str(args.get("keyword", "")).strip():
+            return {"error": "search_knowledge_graph needs a non-empty 'keyword'."}
+        query, params = keyword_search_statement(
+            args["keyword"],
+            args.get("limit"),
+            self.options["normalized_search_enabled"]
+        )
+        return await self.run_query(query, context, params=params, trusted=True)
+
+    async def tool_search_fulltext(self, args, context):
+        if not str(args.get("query", "")).strip():
+            return {"error": "search_fulltext needs at least one keyword in 'query'."}
+        query, params = fulltext_search_statement(args["query"], args.get("limit"))
+        return await self.run_query(query, context, params=params, trusted=True)
+
+    async def tool_search_communities(self, args, context):
+        if not str(args.get("query", "")).strip():
+            return {"error": "search_communities needs at least one keyword in 'query'."}
+        query, params = community_search_statement(args["query"], args.get("limit"))
+        return await self.run_query(query, context, params=params, trusted=True)
+
+    async def tool_expand_neighborhood(self, args, context):
+        query, params = expand_neighborhood_statement(
+            args.get("ids"),
+            args.get("max_entities"),
+            args.get("rel_types"),
+            self.options["max_expanded_relationships"],
+            self.options["max_expanded_entities"]
+        )
+        if not params["ids"]:
+            return {"error": "expand_neighborhood needs at least one id in 'ids'."}
+        return await self.run_query(query, context, params=params, options=self.expand_query_options)
+
+    async def tool_get_entity_cards(self, args, context):
+        query, params = card_lookup_statement(args.get("names_or_ids"))
+        if not params["keys"]:
+            return {"error": "get_entity_cards needs at least one name or id in 'names_or_ids'."}
+        data = await self.run_query(query, context, params=params, options=self.card_query_options)
+        if "error" in data:
+            return data
+        cards, missing = cards_from_rows(params["keys"], data["results"])
+        projection = self.query_options.projection
+        if projection is not None:
+            # Apply the usual string limits to the parsed card instead.
+            cards = [projection.value(card) for card in cards]
+        response = {"results": encode_results(cards, self.options["result_format"])}
+        if missing:
+            response["missing"] = missing
+        return response
+
+    async def tool_resolve_entity(self, args, context):
+        text = str(args.get("text", "")).strip()
+        if not text:
+            return {"error": "resolve_entity needs a non-empty 'text'."}
+        resolver = get_entity_resolver()
+        if resolver is None:
+            # Loaded on first use; one scan of the Entity names.
+            try:
+                resolver = await asyncio.to_thread(ensure_entity_resolver, self.sync_driver(), self.options["database"])
+            except Exception as e:
+                logger.error(f"Could not load the entity resolver: {e}")
+                return {"error": str(e)}
+        matches = resolver.resolve(text, clamp_limit(args.get("limit"), DEFAULT_RESOLVE_LIMIT, MAX_RESOLVE_LIMIT))
+        return {"results": encode_results(matches, self.options["result_format"])}
+
+    async def tool_list_entities_by_type(self, args, context):
+        max_age = self.options["type_index_max_age_seconds"]
+        try:
+            if get_type_index() is None:
+                # Only the first build blocks; later refreshes run in the background.
+                index = await asyncio.to_thread(ensure_type_index, self.sync_driver(), self.options["database"], max_age)
+            else:
+                index = ensure_type_index(self.sync_driver(), self.options["database"], max_age)
+        except Exception as e:
+            logger.error(f"Could not load the type index: {e}")
+            return {"error": str(e)}
+        entity_type = str(args.get("entity_type") or "").strip()
+        if not entity_type:
+            return {"results": encode_results(index.types(), self.options["result_format"])}
+        page = index.page(
+            entity_type,
+            args.get("offset"),
+            clamp_limit(args.get("limit"), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        )
+        if page is None:
+            return {"error": f"Unknown entity type {entity_type!r}.", "types": [item["type"] for item in index.types()]}
+        page["entities"] = encode_results(page["entities"], self.options["result_format"])
+        return page
+
+    async def tool_search_local_index(self, args, context):
+        index = get_search_index()
+        if index is None:
+            return {"error": "The local search index is not loaded."}
+        hits = index.search(args.get("query", ""), limit=clamp_limit(args.get("limit")))
+        return {"results": encode_results(hits, self.options["result_format"])}
+
+    async def tool_hybrid_search(self, args, context):
+        index = get_hybrid_index()
+        if index is None:
+            return {"error": "The hybrid search index is not loaded."}
+        # Scoring is NumPy-bound; keep it off the event loop.
+        hits = await asyncio.to_thread(index.search, str(args.get("query", "")), clamp_limit(args.get("limit")))
+        return {"results": encode_results(hits, self.options["result_format"])}
+
+    async def execute_function_call(self, func_call, context):
+        function_name = func_call.name
+        args = func_call.args or {}
+
+        logger.info(f"Function call detected: {function_name}")
+
+        handler = self.tools.get(function_name)
+        if handler is None:
+            return None
+        # A failing handler answers its own call with the error instead of
+        # aborting the other calls gathered with it.
+        try:
+            data = await handler(args, context)
+        except Exception as e:
+            logger.error(f"Tool {function_name} failed: {e}")
+            data = {"error": str(e)}
+        if data is None:
+            return None
+        return Part.from_function_response(
+            name=function_name,
+            response=data
+        )
+
+    async def execute_function_calls(self, function_calls, context):
+        # Independent calls from one model turn run concurrently, bounded by
+        # max_concurrent_tool_calls; gather keeps the responses in call order.
+        semaphore = asyncio.Semaphore(max(1, self.options["max_concurrent_tool_calls"]))
+
+        async def bounded(func_call):
+            async with semaphore:
+                return await self.execute_function_call(func_call, context)
+
+        results = await asyncio.gather(*(bounded(func_call) for func_call in function_calls))
+        return [result for result in results if result is not None]
+
+    async def community_reports(self, user_query, context):
+        # Global search candidates: ranked by the community document index,
+        # or by the Step 1 keyword search when that index is not built yet.
+        keywords = decompose(user_query)
+        if not keywords:
+            return []
+        query, params = community_reports_statement(keywords, self.options["global_search_candidates"])
+        data = await self.run_query(query, context, params=params, options=self.retrieval_query_options)
+        if "error" not in data:
+            return data["results"]
+
+        logger.warning(f"Community document search failed ({data['error']}); ranking reports by keyword search")
+        _, hits, _ = await self.pre_retrieve(user_query, context)
+        ids = [hit["id"] for hit in hits if hit["label"] in ("Community", "SubCommunity")]
+        if not ids:
+            return []
+        query, params = reports_by_id_statement(ids)
+        data = await self.run_query(query, context, params=params, options=self.retrieval_query_options)
+        if "error" in data:
+            return []
+        rank = {report_id: position for position, report_id in enumerate(ids)}
+        return sorted(data["results"], key=lambda report: rank.get(report["id"], len(rank)))
+
+    async def stream_global_answer(self, user_query, context, client):
+        # Map-reduce over community reports instead of the tool loop; see
+        # global_search.GlobalSearch.
+        yield "step", "*Performing Global Search across communities...*"
+        reports = await self.community_reports(user_query, context)
+        searcher = GlobalSearch(
+            client,
+            self.options["model"],
+            temperature=self.options["temperature"],
+            concurrency=self.options["global_search_concurrency"],
+            report_tokens=self.options["global_search_report_tokens"],
+            map_input_tokens=self.options["global_search_map_input_tokens"],
+            map_output_tokens=self.options["global_search_map_output_tokens"],
+            reduce_input_tokens=self.options["global_search_reduce_input_tokens"],
+            reduce_output_tokens=self.options["global_search_reduce_output_tokens"]
+        )
+        yield "step", f"*Reviewing {len(reports)} community reports...*"
+        points = await searcher.map(user_query, reports)
+        if points:
+            yield "step", f"*Synthesizing the answer from {len(points)} key points...*"
+        final_answer_text = await searcher.reduce(user_query, points)
+        logger.info(f"Global search answer obtained: {len(final_answer_text)} characters")
+        yield "answer", final_answer_text
+
+    async def stream_answer(self, user_query, mode=None):
+        # Yields ("step", text) for interim model notes and a final
+        # ("answer", text) once the function-call loop has finished.
+        mode = mode or self.options["answer_mode"]
+        if mode not in MODES:
+            raise ValueError(f"Unknown answer mode: {mode}")
+        logger.info(f"Processing user query ({mode} mode): {user_query}")
+        context = QuestionContext(user_query)
+        client = get_genai_client(self.google_api_key)
+
+        if mode == GLOBAL:
+            async for event in self.stream_global_answer(user_query, context, client):
+                yield event
+            return
+
+        logger.info("Creating chat instance with Gemini")
+        chat = client.aio.chats.create(
+            model=self.options["model"],
+            config=GenerateContentConfig(
+                temperature=self.options["temperature"],
+                tools=[self.data_tool],
+                system_instruction=self.system_prompt
+            ),
+        )
+
+        message = user_query
+        if self.options["pre_retrieval_enabled"]:
+            keywords, hits, missing = await self.pre_retrieve(user_query, context)
+            if keywords or missing:
+                yield "step", f"*Performing Global Search for: {', '.join(keywords) or 'nothing'}*"
+                message = PRE_RETRIEVAL_MESSAGE.format(
+                    user_query=user_query,
+                    keywords=", ".join(keywords) or "none",
+                    hits=json.dumps(hits, ensure_ascii=False, separators=(",", ":"), default=str),
+                    missing=f"These words were not found in the searchable-field vocabulary, so they were not searched: {', '.join(missing)}.\n" if missing else ""
+                )
+
+        logger.info("Sending user query to Gemini")
+        response = await chat.send_message(message)
+
+        final_answer_text = ""
+
+        logger.info("Starting processing loop for function calls")
+        while True:
+            if not has_parts(response):
+                break
+
+            function_calls = [
+                part.function_call
+                for part in response.candidates[0].content.parts
+                if hasattr(part, "function_call") and part.function_call
+            ]
+
+            if not function_calls:
+                text_response = response_text(response)
+                if text_response.strip():
+                    final_answer_text = text_response
+                break
+
+            interim_text = response_text(response)
+            if interim_text.strip():
+                logger.info(f"Interim text: {interim_text}")
+                yield "step", interim_text
+
+            function_responses = await self.execute_function_calls(function_calls, context)
+
+            if not function_responses:
+                break
+
+            logger.info("Sending function responses back to the model")
+            response = await chat.send_message(function_responses)
+
+        if has_parts(response):
+            final_text = response_text(response)
+            if final_text.strip():
+                final_answer_text = final_text
+                logger.info(f"Final answer obtained: {len(final_text)} characters")
+
+        if self.cache is not None:
+            logger.info(f"Query cache stats: {self.cache.stats()}")
+        logger.info(f"Plan cache stats: {get_plan_tracker().stats()}")
+
+        yield "answer", final_answer_text
+
+    async def answer(self, user_query, mode=None):
+        final_answer_text = ""
+        async for kind, text in self.stream_answer(user_query, mode):
+            if kind == "answer":
+                final_answer_text = text
+        return final_answer_text
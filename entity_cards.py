@@ -0,0 +1,162 @@
+import json
+import logging
+
+from neo4j_client import read_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CARD_RELATIONSHIPS = 10
+DEFAULT_CARD_CHUNKS = 10
+MAX_CARD_KEYS = 50
+
+CARD_PROPERTY = "entity_card"
+
+ENTITY_INDEXES = [
+    ("entity_id_index", "id"),
+    ("entity_name_index", "name"),
+]
+
+ENTITY_IDS_QUERY = "MATCH (e:Entity) WHERE e.id IS NOT NULL RETURN e.id AS id"
+
+# Everything a local search gathers about one Entity, in one pass: its
+# types, parent SubCommunity/Community names, the most connected related
+# Entities with relationship descriptions, and the Chunks mentioning it.
+ENTITY_CARD_QUERY = """
+UNWIND $ids AS entity_id
+MATCH (e:Entity {id: entity_id})
+CALL {
+  WITH e
+  OPTIONAL MATCH (t:EntityType)-[:RELATED_TO]->(e)
+  RETURN collect(DISTINCT coalesce(t.name, t.id)) AS types
+}
+CALL {
+  WITH e
+  OPTIONAL MATCH (e)-[:BELONGS_TO]->(s:SubCommunity)
+  OPTIONAL MATCH (s)-[:BELONGS_TO]->(c:Community)
+  RETURN collect(DISTINCT s.comm_name) AS subcommunities, collect(DISTINCT c.comm_name) AS communities
+}
+CALL {
+  WITH e
+  OPTIONAL MATCH (e)-[r]-(other:Entity)
+  WITH e, r, other
+  ORDER BY r.relationship_description IS NULL, size([(other)--() | 1]) DESC
+  LIMIT $max_relationships
+  RETURN collect(CASE WHEN r IS NULL THEN NULL ELSE {
+    type: type(r),
+    direction: CASE WHEN startNode(r) = e THEN 'out' ELSE 'in' END,
+    entity: other.name,
+    description: r.relationship_description
+  } END) AS relationships
+}
+CALL {
+  WITH e
+  OPTIONAL MATCH (chunk:Chunk)-[:RELATED_TO]->(e)
+  WITH chunk
+  LIMIT $max_chunks
+  RETURN collect(chunk.id) AS chunks
+}
+RETURN e.id AS id, e.name AS name, e.entity_description AS description,
+       types, subcommunities, communities, relationships, chunks
+"""
+
+WRITE_CARDS_QUERY = f"""
+UNWIND $cards AS card
+MATCH (e:Entity {{id: card.id}})
+SET e.{CARD_PROPERTY} = card.json, e.{CARD_PROPERTY}_built_at = datetime()
+"""
+
+# Ids and names are looked up in separate branches so each can use its index.
+CARD_LOOKUP_QUERY = f"""
+CALL {{
+  UNWIND $keys AS key
+  MATCH (e:Entity {{id: key}})
+  RETURN key, e
+  UNION
+  UNWIND $keys AS key
+  MATCH (e:Entity {{name: key}})
+  RETURN key, e
+}}
+RETURN key, e.id AS id, e.{CARD_PROPERTY} AS card
+"""
+
+
+def card_from_record(record):
+    card = {
+        "id": record["id"],
+        "name": record["name"],
+        "description": record["description"],
+        "types": record["types"],
+        "subcommunities": record["subcommunities"],
+        "communities": record["communities"],
+        "relationships": [
+            {key: value for key, value in relationship.items() if value is not None}
+            for relationship in record["relationships"]
+        ],
+        "chunks": record["chunks"],
+    }
+    return {key: value for key, value in card.items() if value not in (None, [])}
+
+
+def _batches(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def create_entity_indexes(driver, database=None):
+    with driver.session(database=database) as session:
+        for name, prop in ENTITY_INDEXES:
+            session.run(f"CREATE INDEX {name} IF NOT EXISTS FOR (e:Entity) ON (e.{prop})").consume()
+
+
+def build_entity_cards(driver, database=None, batch_size=DEFAULT_BATCH_SIZE,
+                       max_relationships=DEFAULT_CARD_RELATIONSHIPS, max_chunks=DEFAULT_CARD_CHUNKS):
+    # Cards are read in batches and written back as a compact JSON string
+    # property on each Entity, so a lookup is a single indexed match.
+    create_entity_indexes(driver, database)
+    with read_session(driver, database) as session:
+        ids = session.execute_read(lambda tx: [record["id"] for record in tx.run(ENTITY_IDS_QUERY)])
+    logger.info(f"Building entity cards for {len(ids)} entities")
+
+    written = 0
+    for batch in _batches(ids, batch_size):
+        with read_session(driver, database) as session:
+            cards = session.execute_read(lambda tx: [
+                card_from_record(record)
+                for record in tx.run(
+                    ENTITY_CARD_QUERY, ids=batch, max_relationships=max_relationships, max_chunks=max_chunks
+                )
+            ])
+        payload = [
+            {"id": card["id"], "json": json.dumps(card, ensure_ascii=False, separators=(",", ":"))}
+            for card in cards
+        ]
+        with driver.session(database=database) as session:
+            session.execute_write(lambda tx: tx.run(WRITE_CARDS_QUERY, cards=payload).consume())
+        written += len(payload)
+        logger.info(f"Wrote {written}/{len(ids)} entity cards")
+    return written
+
+
+def card_lookup_statement(keys):
+    if isinstance(keys, str):
+        keys = [keys]
+    keys = [str(key).strip() for key in keys or [] if str(key).strip()]
+    return CARD_LOOKUP_QUERY, {"keys": list(dict.fromkeys(keys))[:MAX_CARD_KEYS]}
+
+
+def cards_from_rows(keys, rows):
+    # Returns (cards, missing keys); an Entity found by both its id and its
+    # name is returned once.
+    cards = []
+    seen = set()
+    found = set()
+    for row in rows:
+        if not row.get("card"):
+            continue
+        found.add(row["key"])
+        if row["id"] in seen:
+            continue
+        seen.add(row["id"])
+        cards.append(json.loads(row["card"]))
+    return cards, [key for key in keys if key not in found]
@@ -0,0 +1,227 @@
+import array
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+
+from neo4j_client import read_session
+from text_analysis import fold
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOLVE_LIMIT = 5
+MAX_RESOLVE_LIMIT = 25
+MIN_SIMILARITY = 0.2
+# A RELATEDTO/RELATED_TO neighbour counts as an alias (a duplicate of the
+# same real-world entity) only when the names are this similar.
+ALIAS_SIMILARITY = 0.6
+# Share of deleted keys after which an update rebuilds instead of patching.
+COMPACT_RATIO = 0.25
+
+ENTITY_NAMES_QUERY = """
+MATCH (e:Entity)
+WHERE e.id IS NOT NULL AND e.name IS NOT NULL
+OPTIONAL MATCH (e)-[:RELATEDTO|RELATED_TO]-(other:Entity)
+RETURN e.id AS id, e.name AS name, collect(DISTINCT other.name) AS related_names
+"""
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name):
+    return _NON_ALPHANUMERIC.sub(" ", fold(name)).strip()
+
+
+def trigrams(name):
+    normalized = normalize_name(name)
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def similarity(left, right):
+    left, right = trigrams(left), trigrams(right)
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+def _contains_words(longer, shorter):
+    # Whole-word containment: "louis vuitton malletier" contains "louis
+    # vuitton", "service level agreement" does not contain "ice".
+    longer, shorter = longer.split(), shorter.split()
+    return any(longer[start:start + len(shorter)] == shorter for start in range(len(longer) - len(shorter) + 1))
+
+
+def aliases(name, related_names):
+    normalized = normalize_name(name)
+    found = []
+    for other in related_names or []:
+        other_normalized = normalize_name(other)
+        if not other_normalized or other_normalized == normalized or other in found:
+            continue
+        if (
+            _contains_words(normalized, other_normalized)
+            or _contains_words(other_normalized, normalized)
+            or similarity(name, other) >= ALIAS_SIMILARITY
+        ):
+            found.append(other)
+    return found
+
+
+def fetch_entity_names(driver, database=None):
+    def work(tx):
+        return {
+            record["id"]: (record["name"], tuple(aliases(record["name"], record["related_names"])))
+            for record in tx.run(ENTITY_NAMES_QUERY)
+        }
+
+    with read_session(driver, database) as session:
+        return session.execute_read(work)
+
+
+class EntityResolver:
+    # One key per Entity name or alias. Posting lists map each trigram to the
+    # key numbers containing it; a query counts shared trigrams with one
+    # bincount and scores keys by Jaccard similarity. Updates append new keys
+    # and mark replaced ones dead instead of rebuilding the posting lists;
+    # the lock keeps resolve() from reading the arrays while they grow.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.key_entities = []
+        self.key_texts = []
+        self.key_sizes = array.array("I")
+        self.alive = array.array("B")
+        self.postings = {}
+        self.entity_keys = {}
+        self.dead = 0
+        self.built_at = None
+
+    @classmethod
+    def build(cls, entries):
+        resolver = cls()
+        resolver.update(entries)
+        logger.info(f"Built entity resolver: {len(resolver.entries)} entities, {len(resolver.key_texts)} names")
+        return resolver
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _add_key(self, entity_id, text):
+        key_no = len(self.key_texts)
+        grams = trigrams(text)
+        self.key_entities.append(entity_id)
+        self.key_texts.append(text)
+        self.key_sizes.append(len(grams))
+        self.alive.append(1)
+        for gram in grams:
+            self.postings.setdefault(gram, array.array("I")).append(key_no)
+        return key_no
+
+    def _remove_entity(self, entity_id):
+        for key_no in self.entity_keys.pop(entity_id, ()):
+            self.alive[key_no] = 0
+            self.dead += 1
+        self.entries.pop(entity_id, None)
+
+    def update(self, entries):
+        # entries: {entity id: (name, aliases)} for the whole graph. Returns
+        # the number of entities added, changed or removed.
+        with self.lock:
+            return self._update(entries)
+
+    def _update(self, entries):
+        if self.dead and self.dead > COMPACT_RATIO * len(self.key_texts):
+            return self._compact(entries)
+        changed = [entity_id for entity_id, entry in entries.items() if self.entries.get(entity_id) != entry]
+        removed = [entity_id for entity_id in self.entries if entity_id not in entries]
+        for entity_id in removed:
+            self._remove_entity(entity_id)
+        for entity_id in changed:
+            self._remove_entity(entity_id)
+            name, entity_aliases = entries[entity_id]
+            self.entries[entity_id] = (name, entity_aliases)
+            self.entity_keys[entity_id] = [self._add_key(entity_id, text) for text in (name,) + tuple(entity_aliases)]
+        self.built_at = time.time()
+        return len(changed) + len(removed)
+
+    def _compact(self, entries):
+        # Called with the lock held, which the rebuilt state keeps.
+        fresh = EntityResolver()
+        fresh._update(entries)
+        fresh.lock = self.lock
+        self.__dict__.update(fresh.__dict__)
+        return len(entries)
+
+    def resolve(self, text, limit=DEFAULT_RESOLVE_LIMIT, min_similarity=MIN_SIMILARITY):
+        grams = trigrams(text)
+        if not grams:
+            return []
+        with self.lock:
+            return self._resolve(grams, limit, min_similarity)
+
+    def _resolve(self, grams, limit, min_similarity):
+        key_count = len(self.key_texts)
+        if not key_count:
+            return []
+        # The frombuffer views are dropped before the lock is released, so
+        # no buffer export blocks an update that grows the arrays.
+        lists = [np.frombuffer(self.postings[gram], dtype=np.uint32) for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=key_count)
+        sizes = np.frombuffer(self.key_sizes, dtype=np.uint32)
+        scores = shared / (len(grams) + sizes - shared)
+        scores[np.frombuffer(self.alive, dtype=np.uint8) == 0] = 0.0
+        candidates = np.flatnonzero(scores >= min_similarity)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        matches = []
+        seen = set()
+        for key_no in candidates:
+            entity_id = self.key_entities[key_no]
+            if entity_id in seen:
+                continue
+            seen.add(entity_id)
+            name = self.entries[entity_id][0]
+            match = {"id": entity_id, "name": name, "score": round(float(scores[key_no]), 4)}
+            if self.key_texts[key_no] != name:
+                match["matched_alias"] = self.key_texts[key_no]
+            matches.append(match)
+            if len(matches) >= limit:
+                break
+        return matches
+
+
+_entity_resolver = None
+_entity_resolver_lock = threading.Lock()
+
+
+def get_entity_resolver():
+    return _entity_resolver
+
+
+def ensure_entity_resolver(driver, database=None):
+    global _entity_resolver
+    with _entity_resolver_lock:
+        if _entity_resolver is None:
+            _entity_resolver = EntityResolver.build(fetch_entity_names(driver, database))
+    return _entity_resolver
+
+
+def refresh_entity_resolver(driver, database=None):
+    # Patches the loaded resolver with the entities that changed since it
+    # was built; resolve() calls wait for the patch instead of reading
+    # half-updated arrays.
+    entries = fetch_entity_names(driver, database)
+    with _entity_resolver_lock:
+        if _entity_resolver is None:
+            return None
+        changes = _entity_resolver.update(entries)
+    logger.info(f"Refreshed entity resolver: {changes} entities changed")
+    return _entity_resolver
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+
+from google.genai.types import GenerateContentConfig
+
+from result_format import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+GLOBAL = "global"
+MODES = (LOCAL, GLOBAL)
+
+DEFAULT_CANDIDATES = 40
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REPORT_TOKENS = 600
+DEFAULT_MAP_INPUT_TOKENS = 4000
+DEFAULT_MAP_OUTPUT_TOKENS = 1024
+DEFAULT_REDUCE_INPUT_TOKENS = 12000
+DEFAULT_REDUCE_OUTPUT_TOKENS = 2048
+
+MAP_PROMPT = """You are reading community reports from a knowledge graph about LVMH vendors, supply chain and operations.
+Question: {question}
+
+For every report that helps answer the question, extract the key points it supports, using only facts stated in the report.
+Respond with a JSON list of objects: {{"id": "<report id>", "score": <0-100, how much the report helps>, "points": ["<short factual statement>", ...]}}.
+Leave out reports that do not help. Respond with [] if none do.
+
+Reports:
+{reports}
+"""
+
+REDUCE_PROMPT = """Answer the question using only the key points below. They were extracted from community reports of the knowledge graph and are ordered by importance.
+Question: {question}
+
+Key points:
+{points}
+
+Rules:
+Synthesize a coherent, complete answer that covers the main themes rather than listing the points.
+**Only the final synthesized response must be in bold.**
+Refer to the graph as the knowledge graph and never mention ids, reports or scores.
+If the points do not answer the question, say so.
+Always conclude with a positive or forward-looking remark.
+"""
+
+# Returned without a model call when no report yielded a key point.
+NO_ANSWER = (
+    "**No relevant communities were found in the knowledge graph for this question.** "
+    "Try rephrasing it, or use Local search to look up specific vendors, brands or entities."
+)
+
+
+def _truncate(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def format_report(report, max_tokens=DEFAULT_REPORT_TOKENS):
+    lines = [f"[id: {report['id']}] {report.get('label', '')} {report.get('name') or ''}".strip()]
+    if report.get("description"):
+        lines.append(str(report["description"]))
+    for field in ("insights", "keywords"):
+        values = report.get(field)
+        if values:
+            values = values if isinstance(values, list) else [values]
+            lines.append(f"{field.capitalize()}: " + "; ".join(str(value) for value in values))
+    return _truncate("\n".join(lines), max_tokens)
+
+
+def batch_reports(reports, map_input_tokens=DEFAULT_MAP_INPUT_TOKENS, report_tokens=DEFAULT_REPORT_TOKENS):
+    # Packs formatted reports into batches of at most map_input_tokens each,
+    # keeping the ranking order across batches.
+    batches = []
+    current = []
+    used = 0
+    for report in reports:
+        text = format_report(report, report_tokens)
+        tokens = len(text) // CHARS_PER_TOKEN + 1
+        if current and used + tokens > map_input_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append((report, text))
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_points(text, reports):
+    # The map response is JSON by request, but a malformed batch should only
+    # lose its own points.
+    try:
+        entries = json.loads(text or "[]")
+    except ValueError:
+        logger.warning("Global search map step returned invalid JSON; skipping the batch")
+        return []
+    if isinstance(entries, dict):
+        entries = [entries]
+    names = {str(report["id"]): report.get("name") or report.get("label") for report in reports}
+    points = []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or str(entry.get("id")) not in names:
+            continue
+        try:
+            score = float(entry.get("score", 0))
+        except (TypeError, ValueError):
+            continue
+        if score <= 0:
+            continue
+        for point in entry.get("points") or []:
+            if str(point).strip():
+                points.append({"score": score, "point": str(point).strip(), "source": names[str(entry["id"])]})
+    return points
+
+
+class GlobalSearch:
+    # GraphRAG-style global search over ranked community reports: the map
+    # step scores batches of reports against the question concurrently, the
+    # reduce step makes one synthesis call over the best partial answers.
+    # Wall time grows with len(batches) / concurrency, not with the number of
+    # reports.
+    def __init__(self, client, model, temperature=0.0, concurrency=DEFAULT_CONCURRENCY,
+                 report_tokens=DEFAULT_REPORT_TOKENS, map_input_tokens=DEFAULT_MAP_INPUT_TOKENS,
+                 map_output_tokens=DEFAULT_MAP_OUTPUT_TOKENS, reduce_input_tokens=DEFAULT_REDUCE_INPUT_TOKENS,
+                 reduce_output_tokens=DEFAULT_REDUCE_OUTPUT_TOKENS):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.concurrency = max(1, concurrency)
+        self.report_tokens = report_tokens
+        self.map_input_tokens = map_input_tokens
+        self.map_output_tokens = map_output_tokens
+        self.reduce_input_tokens = reduce_input_tokens
+        self.reduce_output_tokens = reduce_output_tokens
+
+    async def map_batch(self, question, batch):
+        reports = "\n\n".join(text for _, text in batch)
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=MAP_PROMPT.format(question=question, reports=reports),
+                config=GenerateContentConfig(
+                    temperature=self.temperature,
+                    max_output_tokens=self.map_output_tokens,
+                    response_mime_type="application/json"
+                ),
+            )
+        except Exception as e:
+            logger.error(f"Global search map call failed: {e}")
+            return []
+        return parse_points(response.text, [report for report, _ in batch])
+
+    async def map(self, question, reports):
+        batches = batch_reports(reports, self.map_input_tokens, self.report_tokens)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(batch):
+            async with semaphore:
+                return await self.map_batch(question, batch)
+
+        logger.info(f"Global search map step: {len(reports)} reports in {len(batches)} batches")
+        results = await asyncio.gather(*(bounded(batch) for batch in batches))
+        points = [point for batch_points in results for point in batch_points]
+        points.sort(key=lambda point: -point["score"])
+        return points
+
+    def reduce_context(self, points):
+        lines = []
+        used = 0
+        for point in points:
+            line = f"- ({point['score']:.0f}) {point['point']} [{point['source']}]"
+            tokens = len(line) // CHARS_PER_TOKEN + 1
+            if used + tokens > self.reduce_input_tokens:
+                break
+            lines.append(line)
+            used += tokens
+        return "\n".join(lines)
+
+    async def reduce(self, question, points):
+        context = self.reduce_context(points)
+        if not context:
+            return NO_ANSWER
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=REDUCE_PROMPT.format(question=question, points=context),
+            config=GenerateContentConfig(
+                temperature=self.temperature,
+                max_output_tokens=self.reduce_output_tokens
+            ),
+        )
+        return response.text or ""
@@ -0,0 +1,252 @@
+import re
+
+from text_analysis import fold
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+DEFAULT_ENTITIES_PER_SOURCE = 25
+MAX_ENTITIES_PER_SOURCE = 100
+DEFAULT_MAX_RELATIONSHIPS = 200
+DEFAULT_MAX_EXPANDED_ENTITIES = 200
+MAX_EXPAND_IDS = 200
+
+# Full-text indexes over exactly the fields the system prompt tells the model
+# to search. Created by `python maintenance.py fulltext-indexes`.
+FULLTEXT_INDEXES = [
+    ("chunk_summary_fulltext", "Chunk", ["summary"]),
+    ("community_text_fulltext", "Community", ["comm_name", "comm_description"]),
+    ("subcommunity_text_fulltext", "SubCommunity", ["comm_name", "comm_description", "keywords", "insights"]),
+]
+
+# (label, property, name expression, text expression) for every field the
+# Step 1 keyword search covers.
+SEARCHABLE_FIELDS = [
+    ("Chunk", "summary", "null", "n.summary"),
+    ("Community", "comm_name", "n.comm_name", "n.comm_description"),
+    ("Community", "comm_description", "n.comm_name", "n.comm_description"),
+    ("SubCommunity", "comm_name", "n.comm_name", "n.comm_description"),
+    ("SubCommunity", "comm_description", "n.comm_name", "n.comm_description"),
+    ("SubCommunity", "keywords", "n.comm_name", "n.comm_description"),
+    ("SubCommunity", "insights", "n.comm_name", "n.comm_description"),
+]
+
+# Properties that may be stored as lists of strings rather than one string.
+LIST_VALUED_PROPERTIES = {"keywords", "insights"}
+
+# Every searchable field gets a lowercased, accent-folded, whitespace-collapsed
+# copy under this suffix (list values joined with newlines), written and
+# TEXT-indexed by `python maintenance.py shadow-properties`.
+SHADOW_SUFFIX = "_norm"
+
+
+def shadow_property(prop):
+    return f"{prop}{SHADOW_SUFFIX}"
+
+
+def shadow_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return "\n".join(fold(item) for item in value if item)
+    return fold(value)
+
+
+SHADOW_INDEXES = [
+    (f"{label.lower()}_{shadow_property(prop)}_text", label, shadow_property(prop))
+    for label, prop, _, _ in SEARCHABLE_FIELDS
+]
+
+_LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+_LUCENE_OPERATORS = {"AND", "OR", "NOT", "TO"}
+
+
+def clamp_limit(limit, default=DEFAULT_SEARCH_LIMIT, maximum=MAX_SEARCH_LIMIT):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def lucene_query(text):
+    # Model input is treated as plain words: Lucene syntax is escaped so a
+    # keyword can never turn into a leading wildcard or a malformed query.
+    terms = []
+    for term in str(text).split():
+        if term in _LUCENE_OPERATORS:
+            term = term.lower()
+        terms.append(_LUCENE_SPECIAL.sub(r"\\\1", term))
+    return " ".join(terms)
+
+
+def _fulltext_branch(index_name, label):
+    return (
+        f"CALL db.index.fulltext.queryNodes('{index_name}', $search, {{limit: $limit}}) YIELD node, score\n"
+        f"  RETURN '{label}' AS label, node.id AS id, node.comm_name AS name,\n"
+        f"         coalesce(node.summary, node.comm_description) AS text, score"
+    )
+
+
+FULLTEXT_SEARCH_QUERY = (
+    "CALL {\n  "
+    + "\n  UNION ALL\n  ".join(_fulltext_branch(name, label) for name, label, _ in FULLTEXT_INDEXES)
+    + "\n}\nRETURN label, id, name, text, score\nORDER BY score DESC\nLIMIT $limit"
+)
+
+
+def fulltext_search_statement(text, limit=None):
+    return FULLTEXT_SEARCH_QUERY, {"search": lucene_query(text), "limit": clamp_limit(limit)}
+
+
+def _keyword_branch(label, prop, name, text, normalized=False):
+    # `[] + value` turns both a string and a list property into a list, so
+    # list-valued keywords/insights are searched element by element. Shadow
+    # properties are always strings.
+    if normalized:
+        predicate = f"n.{shadow_property(prop)} CONTAINS $keyword"
+    elif prop in LIST_VALUED_PROPERTIES:
+        predicate = f"any(value IN ([] + n.{prop}) WHERE value CONTAINS $keyword)"
+    else:
+        predicate = f"n.{prop} CONTAINS $keyword"
+    return (
+        f"MATCH (n:{label}) WHERE {predicate}\n"
+        f"  RETURN '{label}' AS label, n.id AS id, {name} AS name, {text} AS text, '{prop}' AS field"
+    )
+
+
+def _keyword_search_query(normalized=False):
+    return (
+        "CALL {\n  "
+        + "\n  UNION ALL\n  ".join(_keyword_branch(*field, normalized=normalized) for field in SEARCHABLE_FIELDS)
+        + "\n}\n"
+        "WITH label, id, name, text, collect(field) AS matched_fields\n"
+        "RETURN label, id, name, text, matched_fields\n"
+        "ORDER BY size(matched_fields) DESC\n"
+        "LIMIT $limit"
+    )
+
+
+KEYWORD_SEARCH_QUERY = _keyword_search_query()
+NORMALIZED_KEYWORD_SEARCH_QUERY = _keyword_search_query(normalized=True)
+
+
+def keyword_search_statement(keyword, limit=None, normalized=False):
+    # normalized searches the shadow properties, so the keyword is folded the
+    # same way and matching ignores case and accents.
+    if normalized:
+        return NORMALIZED_KEYWORD_SEARCH_QUERY, {"keyword": fold(keyword), "limit": clamp_limit(limit)}
+    return KEYWORD_SEARCH_QUERY, {"keyword": str(keyword).strip(), "limit": clamp_limit(limit)}
+
+
+def covering_keywords(keywords):
+    # CONTAINS "claim" already matches every row CONTAINS "claimed" would, so
+    # only the keywords not containing another one need to be searched.
+    return [
+        keyword for keyword in keywords
+        if not any(other != keyword and other in keyword for other in keywords)
+    ]
+
+
+def merge_keyword_hits(searches, limit=DEFAULT_SEARCH_LIMIT, weights=None):
+    # searches: (term, keyword, rows) per keyword search. Rows found by more
+    # distinct terms rank first, then by how many fields matched. With
+    # weights ({term: idf}) a rare term counts for more than a common one.
+    weights = weights or {}
+    merged = {}
+    for term, keyword, rows in searches:
+        for row in rows:
+            if not isinstance(row, dict) or row.get("id") is None:
+                continue
+            hit = merged.get((row["label"], row["id"]))
+            if hit is None:
+                hit = merged[(row["label"], row["id"])] = {
+                    "label": row["label"],
+                    "id": row["id"],
+                    "name": row.get("name"),
+                    "text": row.get("text"),
+                    "matched_keywords": [],
+                    "matched_fields": [],
+                    "terms": set(),
+                }
+            hit["terms"].add(term)
+            if keyword not in hit["matched_keywords"]:
+                hit["matched_keywords"].append(keyword)
+            for field in row.get("matched_fields") or []:
+                if field not in hit["matched_fields"]:
+                    hit["matched_fields"].append(field)
+    ranked = sorted(
+        merged.values(),
+        key=lambda hit: (-sum(weights.get(term, 1.0) for term in hit["terms"]), -len(hit["matched_fields"]))
+    )
+    for hit in ranked:
+        del hit["terms"]
+    return ranked[:limit]
+
+
+# Step 2 for any number of seeds in one roundtrip: Chunk ids reach their
+# Entities through RELATED_TO, SubCommunity ids through BELONGS_TO and
+# Community ids through SubCommunity. Each seed contributes at most
+# $max_entities entities and at most $max_total_entities are kept, most
+# shared first; relationships are those between the kept entities,
+# optionally restricted to $rel_types. Relationship rows come first so a
+# row or byte cap cuts the least shared entities rather than them.
+EXPAND_NEIGHBORHOOD_QUERY = """
+CALL {
+  UNWIND $ids AS seed_id
+  MATCH (seed:Chunk {id: seed_id})-[:RELATED_TO]-(e:Entity)
+  RETURN seed, e
+  UNION
+  UNWIND $ids AS seed_id
+  MATCH (e:Entity)-[:BELONGS_TO]->(seed:SubCommunity {id: seed_id})
+  RETURN seed, e
+  UNION
+  UNWIND $ids AS seed_id
+  MATCH (e:Entity)-[:BELONGS_TO]->(:SubCommunity)-[:BELONGS_TO]->(seed:Community {id: seed_id})
+  RETURN seed, e
+}
+WITH seed, collect(DISTINCT e)[..$max_entities] AS seed_entities
+UNWIND seed_entities AS e
+WITH e, collect(DISTINCT seed.id) AS sources
+ORDER BY size(sources) DESC
+LIMIT $max_total_entities
+WITH collect({node: e, sources: sources}) AS rows
+CALL {
+  WITH rows
+  WITH [row IN rows | row.node] AS entities
+  UNWIND entities AS a
+  MATCH (a)-[r]->(b:Entity)
+  WHERE b IN entities AND (size($rel_types) = 0 OR type(r) IN $rel_types)
+  WITH DISTINCT a, r, b
+  LIMIT $max_relationships
+  RETURN 'relationship' AS kind, {
+    source: a.name, type: type(r), target: b.name, description: r.relationship_description
+  } AS item
+  UNION ALL
+  WITH rows
+  UNWIND rows AS row
+  RETURN 'entity' AS kind, {
+    id: row.node.id, name: row.node.name, description: row.node.entity_description, sources: row.sources
+  } AS item
+}
+RETURN kind, item
+"""
+
+
+def _string_list(values):
+    # Tolerates a single value where a list was asked for.
+    if values is None:
+        return []
+    if isinstance(values, (str, bytes, dict)) or not hasattr(values, "__iter__"):
+        values = [values]
+    return [str(value) for value in values if value is not None and str(value).strip()]
+
+
+def expand_neighborhood_statement(ids, max_entities=None, rel_types=None, max_relationships=DEFAULT_MAX_RELATIONSHIPS,
+                                  max_total_entities=DEFAULT_MAX_EXPANDED_ENTITIES):
+    return EXPAND_NEIGHBORHOOD_QUERY, {
+        "ids": list(dict.fromkeys(_string_list(ids)))[:MAX_EXPAND_IDS],
+        "max_entities": clamp_limit(max_entities, DEFAULT_ENTITIES_PER_SOURCE, MAX_ENTITIES_PER_SOURCE),
+        "rel_types": _string_list(rel_types),
+        "max_relationships": int(max_relationships),
+        "max_total_entities": int(max_total_entities),
+    }
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from text_analysis import stem, terms, tokenize, with_synonyms
+
+logger = logging.getLogger(__name__)
+
+HASHING = "hashing"
+SENTENCE_TRANSFORMERS_PREFIX = "sentence-transformers:"
+
+DEFAULT_HASHING_DIMENSIONS = 512
+DEFAULT_ALPHA = 0.5
+# A document without any query term must be at least this close in
+# embedding space; hashed sub-word features give nearly every document a
+# small positive cosine.
+DEFAULT_MIN_VECTOR_SCORE = 0.2
+EMBEDDING_BATCH_SIZE = 256
+
+
+class HashingEmbedder:
+    # Deterministic, dependency-free embeddings: stems and character
+    # trigrams are hashed into a signed bag of features and L2-normalized.
+    # Paraphrase recall is limited to shared stems and sub-words, but it is
+    # stable across processes, which makes it the fallback and the test stub.
+    matches_paraphrases = False
+
+    def __init__(self, dimensions=DEFAULT_HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _features(self, text):
+        for token in tokenize(text):
+            stemmed = stem(token)
+            yield f"w:{stemmed}", 1.0
+            padded = f"#{stemmed}#"
+            for start in range(len(padded) - 2):
+                yield f"c:{padded[start:start + 3]}", 0.5
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dimensions] += sign * weight
+        return normalize_rows(vectors)
+
+
+class SentenceTransformerEmbedder:
+    matches_paraphrases = True
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+        return normalize_rows(vectors.astype(np.float32))
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def load_embedder(spec=HASHING):
+    # "hashing" or "sentence-transformers:<model name>". Any object with an
+    # embed(texts) -> float32 matrix method can be passed to HybridIndex too.
+    if spec and spec.startswith(SENTENCE_TRANSFORMERS_PREFIX):
+        model_name = spec[len(SENTENCE_TRANSFORMERS_PREFIX):]
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            logger.warning(f"Could not load embedding model {model_name}: {e}. Falling back to hashing embeddings.")
+    logger.warning("Hybrid search uses hashing embeddings: paraphrases only match through the built-in synonym list")
+    return HashingEmbedder()
+
+
+class HybridIndex:
+    # BM25 from the inverted index fused with cosine similarity over one
+    # embedding per indexed document; both scores are scaled to [0, 1] and
+    # mixed with weight alpha on the keyword side.
+    def __init__(self, inverted_index, embedder, alpha=DEFAULT_ALPHA, min_vector_score=DEFAULT_MIN_VECTOR_SCORE):
+        self.inverted_index = inverted_index
+        self.embedder = embedder
+        self.alpha = alpha
+        self.min_vector_score = min_vector_score
+        texts = inverted_index.texts
+        batches = [
+            embedder.embed(texts[start:start + EMBEDDING_BATCH_SIZE])
+            for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+        ]
+        self.vectors = np.vstack(batches) if batches else np.zeros((0, 1), dtype=np.float32)
+        logger.info(f"Built hybrid index: {self.vectors.shape[0]} vectors of {self.vectors.shape[1]} dimensions")
+
+    def search(self, text, limit=20):
+        index = self.inverted_index
+        if not len(index):
+            return []
+
+        # Without a semantic model the query is widened with known synonyms,
+        # so "supplier problems" can still reach "vendor issues".
+        if not getattr(self.embedder, "matches_paraphrases", True):
+            text = with_synonyms(text)
+        query_vector = self.embedder.embed([text])[0]
+        cosine = np.clip(self.vectors @ query_vector, 0.0, None)
+
+        keyword = np.zeros(len(index), dtype=np.float32)
+        query_terms = list(dict.fromkeys(terms(text)))
+        for doc_no, score in index.bm25_scores(query_terms).items():
+            keyword[doc_no] = score
+        if keyword.max() > 0:
+            keyword /= keyword.max()
+
+        fused = self.alpha * keyword + (1 - self.alpha) * cosine
+        candidates = np.flatnonzero((keyword > 0) | (cosine >= self.min_vector_score))
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-fused[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.argsort(-fused[candidates])]
+
+        hits = []
+        for doc_no in ranked:
+            hit = index.hit(int(doc_no), float(fused[doc_no]), query_terms)
+            hit["keyword_score"] = round(float(keyword[doc_no]), 4)
+            hit["vector_score"] = round(float(cosine[doc_no]), 4)
+            hits.append(hit)
+        return hits
+
+
+_hybrid_index = None
+_hybrid_index_lock = threading.Lock()
+
+
+def get_hybrid_index():
+    return _hybrid_index
+
+
+def ensure_hybrid_index(inverted_index, embedding_model=HASHING, alpha=DEFAULT_ALPHA):
+    global _hybrid_index
+    with _hybrid_index_lock:
+        if _hybrid_index is None:
+            _hybrid_index = HybridIndex(inverted_index, load_embedder(embedding_model), alpha)
+        elif _hybrid_index.inverted_index is not inverted_index:
+            # The search index was reloaded; re-embed with the same model.
+            _hybrid_index = HybridIndex(inverted_index, _hybrid_index.embedder, alpha)
+    return _hybrid_index
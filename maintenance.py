@@ -0,0 +1,119 @@
+import argparse
+import logging
+import os
+
+from community_documents import DEFAULT_BATCH_SIZE as COMMUNITY_BATCH_SIZE, DEFAULT_MAX_MEMBERS, build_community_documents
+from entity_cards import DEFAULT_BATCH_SIZE, DEFAULT_CARD_CHUNKS, DEFAULT_CARD_RELATIONSHIPS, build_entity_cards
+from graph_tools import FULLTEXT_INDEXES, SEARCHABLE_FIELDS, SHADOW_INDEXES, shadow_property, shadow_value
+from neo4j_client import get_driver, read_session
+from search_index import reload_search_index
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+INDEX_WAIT_SECONDS = 600
+SHADOW_BATCH_SIZE = 1000
+
+
+def create_fulltext_indexes(driver, database=None, args=None):
+    with driver.session(database=database) as session:
+        for name, label, properties in FULLTEXT_INDEXES:
+            fields = ", ".join(f"n.{prop}" for prop in properties)
+            logger.info(f"Creating full-text index {name} on :{label}({', '.join(properties)})")
+            session.run(f"CREATE FULLTEXT INDEX {name} IF NOT EXISTS FOR (n:{label}) ON EACH [{fields}]").consume()
+        session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+    logger.info("Full-text indexes are online")
+
+
+def write_shadow_properties(driver, database=None, args=None):
+    # Folding happens here rather than in Cypher: accent folding needs
+    # Unicode decomposition, which plain Cypher does not offer.
+    batch_size = args.batch_size if args else SHADOW_BATCH_SIZE
+    properties_by_label = {}
+    for label, prop, _, _ in SEARCHABLE_FIELDS:
+        properties_by_label.setdefault(label, []).append(prop)
+
+    with driver.session(database=database) as session:
+        for label in properties_by_label:
+            session.run(f"CREATE INDEX {label.lower()}_id_index IF NOT EXISTS FOR (n:{label}) ON (n.id)").consume()
+        session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+
+    for label, properties in properties_by_label.items():
+        fields = ", ".join(f"n.{prop} AS {prop}" for prop in properties)
+        with read_session(driver, database) as session:
+            rows = session.execute_read(lambda tx: [
+                {"id": record["id"], "shadow": {shadow_property(prop): shadow_value(record[prop]) for prop in properties}}
+                for record in tx.run(f"MATCH (n:{label}) WHERE n.id IS NOT NULL RETURN n.id AS id, {fields}")
+            ])
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            with driver.session(database=database) as session:
+                session.execute_write(lambda tx: tx.run(
+                    f"UNWIND $rows AS row MATCH (n:{label} {{id: row.id}}) SET n += row.shadow", rows=batch
+                ).consume())
+        logger.info(f"Wrote shadow properties for {len(rows)} {label} nodes")
+
+    with driver.session(database=database) as session:
+        for name, label, prop in SHADOW_INDEXES:
+            logger.info(f"Creating text index {name} on :{label}({prop})")
+            session.run(f"CREATE TEXT INDEX {name} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})").consume()
+        session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+    logger.info("Shadow property indexes are online")
+
+
+def index_community_documents(driver, database=None, args=None):
+    build_community_documents(driver, database, args.batch_size, args.max_members)
+
+
+def snapshot_search_index(driver, database=None, args=None):
+    reload_search_index(driver, database, snapshot_path=args.output)
+
+
+def materialize_entity_cards(driver, database=None, args=None):
+    build_entity_cards(driver, database, args.batch_size, args.max_relationships, args.max_chunks)
+
+
+COMMANDS = {
+    "fulltext-indexes": (create_fulltext_indexes, "Create the full-text indexes used by search_fulltext.", []),
+    "shadow-properties": (write_shadow_properties, "Write and index the normalized *_norm copies of the searchable fields.", [
+        (("--batch-size",), {"type": int, "default": SHADOW_BATCH_SIZE, "help": "Nodes per write transaction."}),
+    ]),
+    "community-documents": (index_community_documents, "Build and index one search document per Community/SubCommunity.", [
+        (("--batch-size",), {"type": int, "default": COMMUNITY_BATCH_SIZE, "help": "Nodes per write transaction."}),
+        (("--max-members",), {"type": int, "default": DEFAULT_MAX_MEMBERS, "help": "Member Entity names kept per document."}),
+    ]),
+    "search-index-snapshot": (snapshot_search_index, "Build the in-process inverted index and save a snapshot.", [
+        (("--output",), {"default": "search_index.json.gz", "help": "Snapshot file to write."}),
+    ]),
+    "entity-cards": (materialize_entity_cards, "Build the per-Entity cards served by get_entity_cards.", [
+        (("--batch-size",), {"type": int, "default": DEFAULT_BATCH_SIZE, "help": "Entities per transaction."}),
+        (("--max-relationships",), {"type": int, "default": DEFAULT_CARD_RELATIONSHIPS, "help": "Relationships kept per card."}),
+        (("--max-chunks",), {"type": int, "default": DEFAULT_CARD_CHUNKS, "help": "Chunk references kept per card."}),
+    ]),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintenance jobs for the LVMH knowledge graph.")
+    parser.add_argument("--uri", default=os.environ.get("NEO4J_URI"))
+    parser.add_argument("--user", default=os.environ.get("NEO4J_USER"))
+    parser.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD"))
+    parser.add_argument("--database", default=os.environ.get("NEO4J_DATABASE"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text, arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        for flags, kwargs in arguments:
+            subparser.add_argument(*flags, **kwargs)
+
+    args = parser.parse_args(argv)
+    driver = get_driver(args.uri, args.user, args.password)
+    job, _, _ = COMMANDS[args.command]
+    job(driver, args.database, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import asyncio
+import atexit
+import copy
+import json
+import logging
+import threading
+import time
+import weakref
+
+from neo4j import READ_ACCESS, AsyncGraphDatabase, GraphDatabase, unit_of_work
+
+from result_format import PRETTY, encode_results, jsonable, payload_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+    "max_connection_pool_size": 50,
+    "connection_acquisition_timeout": 30.0,
+    "max_connection_lifetime": 3600,
+    "liveness_check_timeout": 60.0,
+}
+
+# Records read past the row/byte cap before the rest is discarded. Each one
+# is a full record transfer, so by default reading stops at the first and
+# remaining_rows is only a lower bound.
+DEFAULT_MAX_ROWS_COUNTED = 1
+DEFAULT_QUERY_TIMEOUT = 60.0
+DEFAULT_INDEX_STATE_MAX_AGE = 300.0
+
+ONLINE_INDEXES_QUERY = "SHOW INDEXES YIELD name, state WHERE state = 'ONLINE' RETURN name"
+
+_drivers = {}
+_async_drivers = weakref.WeakKeyDictionary()
+_drivers_lock = threading.Lock()
+_online_indexes = {}
+_online_indexes_lock = threading.Lock()
+
+
+def pool_settings(**overrides):
+    settings = dict(DEFAULT_POOL_SETTINGS)
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+
+def get_driver(neo4j_uri, neo4j_user, neo4j_password, **overrides):
+    # One driver per (uri, credentials) for the whole process. The driver owns
+    # the connection pool and is thread-safe, so every Streamlit session and
+    # every tool call borrows connections from it instead of reconnecting.
+    key = (neo4j_uri, neo4j_user, neo4j_password)
+    driver = _drivers.get(key)
+    if driver is not None:
+        return driver
+
+    with _drivers_lock:
+        driver = _drivers.get(key)
+        if driver is None:
+            settings = pool_settings(**overrides)
+            logger.info(f"Creating shared Neo4j driver for {neo4j_uri} with {settings}")
+            driver = GraphDatabase.driver(
+                neo4j_uri,
+                auth=(neo4j_user, neo4j_password),
+                **settings
+            )
+            _drivers[key] = driver
+    return driver
+
+
+def get_async_driver(neo4j_uri, neo4j_user, neo4j_password, **overrides):
+    # Async drivers are bound to the event loop they are used from, so they are
+    # shared per loop rather than per process.
+    loop = asyncio.get_running_loop()
+    key = (neo4j_uri, neo4j_user, neo4j_password)
+
+    with _drivers_lock:
+        loop_drivers = _async_drivers.setdefault(loop, {})
+        driver = loop_drivers.get(key)
+        if driver is None:
+            settings = pool_settings(**overrides)
+            logger.info(f"Creating shared async Neo4j driver for {neo4j_uri} with {settings}")
+            driver = AsyncGraphDatabase.driver(
+                neo4j_uri,
+                auth=(neo4j_user, neo4j_password),
+                **settings
+            )
+            loop_drivers[key] = driver
+    return driver
+
+
+def close_drivers():
+    with _drivers_lock:
+        for driver in _drivers.values():
+            try:
+                driver.close()
+            except Exception as e:
+                logger.warning(f"Error closing Neo4j driver: {e}")
+        _drivers.clear()
+
+
+atexit.register(close_drivers)
+
+
+def record_to_dict(record, projection=None):
+    if projection is not None:
+        return {key: projection.value(value) for key, value in record.items()}
+    return {key: (dict(value) if hasattr(value, "keys") else value) for key, value in record.items()}
+
+
+def new_async_bookmark_manager():
+    return AsyncGraphDatabase.bookmark_manager()
+
+
+def read_session(driver, database=None, bookmark_manager=None, fetch_size=None):
+    # READ access lets a cluster-aware (neo4j://) driver route the session to
+    # followers and read replicas, and the server refuses any write attempted
+    # inside the transaction.
+    config = {"fetch_size": fetch_size} if fetch_size else {}
+    return driver.session(
+        database=database,
+        default_access_mode=READ_ACCESS,
+        bookmark_manager=bookmark_manager,
+        **config
+    )
+
+
+def get_online_indexes(driver, database=None, max_age=DEFAULT_INDEX_STATE_MAX_AGE):
+    # Names of the indexes that are ONLINE, re-read at most every max_age
+    # seconds. Errors propagate so the caller decides what a failed check means.
+    key = (id(driver), database)
+    with _online_indexes_lock:
+        cached = _online_indexes.get(key)
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+    # A single auto-commit run: no transaction retries while the server is
+    # unreachable.
+    with read_session(driver, database) as session:
+        names = {record["name"] for record in session.run(ONLINE_INDEXES_QUERY)}
+    with _online_indexes_lock:
+        _online_indexes[key] = (time.monotonic(), names)
+    return names
+
+
+def clear_online_indexes():
+    with _online_indexes_lock:
+        _online_indexes.clear()
+
+
+class ResultCollector:
+    # Keeps at most max_rows rows / max_bytes of encoded rows in memory. Past
+    # the cap it only counts further records, up to max_rows_counted, before
+    # the rest of the result is discarded on the server.
+    def __init__(self, max_rows=None, max_bytes=None, max_rows_counted=DEFAULT_MAX_ROWS_COUNTED, projection=None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_rows_counted = max_rows_counted
+        self.projection = projection
+        self.rows = []
+        self.bytes = 0
+        self.truncated = False
+        self.remaining_rows = 0
+        self.remaining_exact = True
+
+    def add(self, record):
+        if not self.truncated:
+            row = record_to_dict(record, self.projection)
+            size = payload_size(jsonable(row))
+            fits_rows = not self.max_rows or len(self.rows) < self.max_rows
+            fits_bytes = not self.max_bytes or self.bytes + size <= self.max_bytes
+            if fits_rows and fits_bytes:
+                self.rows.append(row)
+                self.bytes += size
+                return True
+            self.truncated = True
+
+        self.remaining_rows += 1
+        if self.remaining_rows >= self.max_rows_counted:
+            self.remaining_exact = False
+            return False
+        return True
+
+    def truncation(self):
+        if not self.truncated:
+            return None
+        return {
+            "rows_returned": len(self.rows),
+            "remaining_rows": self.remaining_rows,
+            "remaining_rows_is_lower_bound": not self.remaining_exact,
+            "reason": "Result exceeded the row or byte limit. Narrow the query, add a LIMIT or return fewer properties.",
+        }
+
+
+class QueryOptions:
+    # How tool queries are executed and encoded. One instance is built per
+    # engine and shared by every call; cache_key() keeps cached results from
+    # leaking between differently configured engines.
+    def __init__(self, result_format=PRETTY, max_rows=None, max_bytes=None,
+                 max_rows_counted=DEFAULT_MAX_ROWS_COUNTED, projection=None,
+                 timeout=DEFAULT_QUERY_TIMEOUT, guard=None, plan_tracker=None):
+        self.result_format = result_format
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_rows_counted = max_rows_counted
+        self.projection = projection
+        self.timeout = timeout
+        self.guard = guard
+        self.plan_tracker = plan_tracker
+
+    def trusted(self):
+        # Same limits and encoding, minus the cost guard, for the fixed
+        # parameterized queries behind the dedicated search tools.
+        options = copy.copy(self)
+        options.guard = None
+        return options
+
+    def collector(self):
+        return ResultCollector(self.max_rows, self.max_bytes, self.max_rows_counted, self.projection)
+
+    def fetch_size(self):
+        # Records pulled per batch: no more than the collector will read, so
+        # a capped result does not stream a full default batch first.
+        if not self.max_rows:
+            return None
+        return self.max_rows + max(1, self.max_rows_counted)
+
+    def cache_key(self):
+        return (
+            self.result_format,
+            self.max_rows,
+            self.max_bytes,
+            self.projection.cache_key() if self.projection else None,
+            self.guard.cache_key() if self.guard else None,
+        )
+
+
+async def _collect_records_async(tx, query, params, options):
+    # Built per attempt so a retried transaction starts from an empty collector.
+    collector = options.collector()
+    result = await tx.run(query, params)
+    async for record in result:
+        if not collector.add(record):
+            break
+    await result.consume()
+    return collector
+
+
+async def _explain_async(tx, query, params):
+    result = await tx.run(f"EXPLAIN {query}", params)
+    summary = await result.consume()
+    return summary.plan
+
+
+def _with_timeout(work, timeout):
+    # The timeout is enforced by the server, which terminates the transaction
+    # once it is exceeded instead of letting it hold a worker indefinitely.
+    if not timeout:
+        return work
+    return unit_of_work(timeout=timeout)(work)
+
+
+def _cached_result(cache, query, params, database, options):
+    if cache is None:
+        return None
+    cached = cache.get(query, database, variant=options.cache_key(), params=params)
+    if cached is not None:
+        logger.info("Query served from result cache")
+    return cached
+
+
+def _encode_and_cache(collector, query, params, database, options, cache, verdict=None):
+    response = {"results": encode_results(collector.rows, options.result_format)}
+    truncation = collector.truncation()
+    if truncation:
+        response["truncated"] = truncation
+    if verdict is not None and verdict.rewritten:
+        response["cost_guard"] = verdict.note()
+    size = payload_size(response)
+    logger.info(
+        f"Query completed successfully. Result count: {len(collector.rows)}, "
+        f"truncated: {bool(truncation)}, payload bytes: {size}"
+    )
+    if cache is not None:
+        cache.put(query, response, database, variant=options.cache_key(), size=size, params=params)
+    return response
+
+
+def _error_result(e, options):
+    logger.error(f"Error executing Neo4j query: {e}")
+    if options.result_format == PRETTY:
+        return {"results": json.dumps({"error": str(e)})}
+    return {"error": str(e)}
+
+
+async def run_cypher_query_async(query, driver, database=None, bookmark_manager=None, cache=None, options=None,
+                                 params=None):
+    logger.info(f"Executing Neo4j query: {query}")
+    options = options or QueryOptions()
+    params = params or {}
+
+    cached = _cached_result(cache, query, params, database, options)
+    if cached is not None:
+        return cached
+
+    try:
+        async with read_session(driver, database, bookmark_manager, options.fetch_size()) as session:
+            verdict = None
+            statement = query
+            if options.guard is not None:
+                explain = _with_timeout(_explain_async, options.guard.explain_timeout)
+                verdict = await options.guard.decide(query, lambda text: session.execute_read(explain, text, params))
+                if verdict.rejected:
+                    return verdict.response()
+                statement = verdict.query
+
+            if options.plan_tracker is not None:
+                options.plan_tracker.record(statement)
+            # Cancelling the awaiting task (e.g. an abandoned question) makes
+            # the driver drop the connection, which rolls the transaction back
+            # on the server.
+            collector = await session.execute_read(
+                _with_timeout(_collect_records_async, options.timeout),
+                statement,
+                params,
+                options
+            )
+
+        return _encode_and_cache(collector, query, params, database, options, cache, verdict)
+    except Exception as e:
+        return _error_result(e, options)
+
+
+async def _run_in_transaction_async(tx, query, params, database, cache, options):
+    verdict = None
+    statement = query
+    if options.guard is not None:
+        verdict = await options.guard.decide(query, lambda text: _explain_async(tx, text, params))
+        if verdict.rejected:
+            return verdict.response()
+        statement = verdict.query
+
+    if options.plan_tracker is not None:
+        options.plan_tracker.record(statement)
+    collector = await _collect_records_async(tx, statement, params, options)
+    return _encode_and_cache(collector, query, params, database, options, cache, verdict)
+
+
+async def run_cypher_batch_async(statements, driver, database=None, bookmark_manager=None, cache=None, options=None):
+    # statements: [(query, params)]. Every uncached statement runs in one
+    # session and one read transaction, saving a session, routing lookup and
+    # transaction roundtrip per query. A failing statement leaves the server
+    # transaction unusable, so it gets its error response and the remaining
+    # statements continue in a fresh transaction on the same session.
+    # A transaction's timeout is options.timeout per statement left, and a
+    # fresh one is started whenever less than options.timeout remains, so no
+    # statement gets less time than it would on its own.
+    # Returns one response per statement, in order.
+    logger.info(f"Executing Neo4j batch of {len(statements)} queries")
+    options = options or QueryOptions()
+    responses = [None] * len(statements)
+    pending = []
+    for position, (query, params) in enumerate(statements):
+        params = params or {}
+        cached = _cached_result(cache, query, params, database, options)
+        if cached is not None:
+            responses[position] = cached
+        else:
+            pending.append((position, query, params))
+
+    loop = asyncio.get_running_loop()
+    try:
+        async with read_session(driver, database, bookmark_manager, options.fetch_size()) as session:
+            while pending:
+                budget = options.timeout * len(pending) if options.timeout else None
+                started = loop.time()
+                tx = await session.begin_transaction(timeout=budget)
+                try:
+                    ran = 0
+                    while pending:
+                        if ran and budget and loop.time() - started + options.timeout > budget:
+                            break
+                        ran += 1
+                        position, query, params = pending.pop(0)
+                        logger.info(f"Executing Neo4j query: {query}")
+                        try:
+                            responses[position] = await _run_in_transaction_async(
+                                tx, query, params, database, cache, options
+                            )
+                        except Exception as e:
+                            responses[position] = _error_result(e, options)
+                            break
+                finally:
+                    # Read-only work: closing rolls back, nothing to commit.
+                    await tx.close()
+    except Exception as e:
+        for position, _, _ in pending:
+            responses[position] = _error_result(e, options)
+    return responses
@@ -0,0 +1,77 @@
+from neo4j.graph import Node, Path, Relationship
+
+ALL_LABELS = "*"
+
+DEFAULT_DENY = {
+    ALL_LABELS: ["embedding", "embeddings", "vector", "text_embedding", "summary_embedding"],
+}
+DEFAULT_MAX_STRING_LENGTH = 2000
+DEFAULT_VECTOR_MIN_LENGTH = 64
+
+
+def is_vector(value, min_length=DEFAULT_VECTOR_MIN_LENGTH):
+    return (
+        isinstance(value, (list, tuple))
+        and len(value) >= min_length
+        and all(isinstance(item, float) for item in value[:min_length])
+    )
+
+
+class PropertyProjection:
+    # allow / deny map a node label or relationship type (or "*" for all of
+    # them) to property names. When a label has an allow list only those
+    # properties are kept; deny lists always apply.
+    def __init__(self, allow=None, deny=None, max_string_length=DEFAULT_MAX_STRING_LENGTH,
+                 vector_min_length=DEFAULT_VECTOR_MIN_LENGTH):
+        self.allow = {key: set(value) for key, value in (allow or {}).items()}
+        self.deny = {key: set(value) for key, value in (DEFAULT_DENY if deny is None else deny).items()}
+        self.max_string_length = max_string_length
+        self.vector_min_length = vector_min_length
+
+    def cache_key(self):
+        return (
+            tuple(sorted((key, tuple(sorted(value))) for key, value in self.allow.items())),
+            tuple(sorted((key, tuple(sorted(value))) for key, value in self.deny.items())),
+            self.max_string_length,
+            self.vector_min_length,
+        )
+
+    def _keeps(self, names, prop):
+        if prop in self.deny.get(ALL_LABELS, ()):
+            return False
+        allowed = [self.allow[name] for name in names if name in self.allow]
+        if ALL_LABELS in self.allow:
+            allowed.append(self.allow[ALL_LABELS])
+        if allowed and not any(prop in allow for allow in allowed):
+            return False
+        return not any(prop in self.deny.get(name, ()) for name in names)
+
+    def _properties(self, names, properties):
+        projected = {}
+        for key, value in properties:
+            if not self._keeps(names, key) or is_vector(value, self.vector_min_length):
+                continue
+            projected[key] = self.value(value)
+        return projected
+
+    def value(self, value):
+        if isinstance(value, Node):
+            return self._properties(value.labels, value.items())
+        if isinstance(value, Relationship):
+            return self._properties((value.type,), value.items())
+        if isinstance(value, Path):
+            return {
+                "nodes": [self.value(node) for node in value.nodes],
+                "relationships": [self.value(rel) for rel in value.relationships],
+            }
+        if isinstance(value, str):
+            if self.max_string_length and len(value) > self.max_string_length:
+                return value[:self.max_string_length] + f"... [truncated {len(value) - self.max_string_length} chars]"
+            return value
+        if is_vector(value, self.vector_min_length):
+            return f"[{len(value)}-dim vector omitted]"
+        if isinstance(value, (list, tuple)):
+            return [self.value(item) for item in value]
+        if hasattr(value, "keys"):
+            return {key: self.value(value[key]) for key in value.keys()}
+        return value
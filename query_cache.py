@@ -0,0 +1,211 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 3600.0
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_PLAN_CACHE_SIZE = 1000
+
+CYPHER_KEYWORDS = {
+    "all", "and", "any", "as", "asc", "ascending", "by", "call", "case", "contains", "count",
+    "create", "delete", "desc", "descending", "detach", "distinct", "else", "end", "ends",
+    "exists", "false", "in", "is", "limit", "match", "merge", "none", "not", "null", "on",
+    "optional", "or", "order", "remove", "return", "set", "single", "skip", "starts", "then",
+    "true", "union", "unwind", "when", "where", "with", "xor", "yield",
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`")
+_PLACEHOLDER = "\x00{}\x00"
+_WORD = re.compile(r"(?<![.:$])\b[A-Za-z_][A-Za-z0-9_]*\b(?!:)")
+# Names the query binds: pattern and comprehension variables ("(end)",
+# "[r:TYPE]", "[x IN ...") and aliases ("AS count").
+_BOUND_NAME = re.compile(
+    r"[(\[]\s*([A-Za-z_][A-Za-z0-9_]*)(?=\s*[:){\]]|\s+[Ii][Nn]\b)|\b[Aa][Ss]\s+([A-Za-z_][A-Za-z0-9_]*)"
+)
+_IN_LIST = re.compile(r"\bIN \[([^\[\]]*)\](?!\[)")
+_CLAUSE = re.compile(
+    r"\b(?:WHERE|MATCH|OPTIONAL|WITH|RETURN|UNWIND|CALL|YIELD|ORDER|SKIP|LIMIT|"
+    r"SET|CREATE|MERGE|DELETE|REMOVE|UNION|FOREACH)\b"
+)
+_ITERATOR = re.compile(r"[\[(,|]\s*[A-Za-z_][A-Za-z0-9_]*\s*$")
+_SIMPLE_LITERAL = re.compile(r"^(?:\x00\d+\x00|-?\d+(?:\.\d+)?)$")
+
+
+def normalize_query(query):
+    # Two query texts map to the same key when they differ only in
+    # whitespace, keyword case or the order of literals in a WHERE
+    # membership test (`n.id IN ['a', 'b']`).
+    literals = []
+
+    def stash(match):
+        literals.append(match.group(0))
+        return _PLACEHOLDER.format(len(literals) - 1)
+
+    text = _STRING_LITERAL.sub(stash, query.strip().rstrip(";"))
+    text = " ".join(text.split())
+    text = re.sub(r"\s*([(),\[\]{}:=<>])\s*", r"\1", text)
+    text = re.sub(r"\b(IN|in|In|iN)\[", r"\1 [", text)
+    # Variables and aliases spelled like keywords keep their case, since
+    # `AS count` and `AS COUNT` name different columns.
+    bound = {name for names in _BOUND_NAME.findall(text) for name in names if name}
+
+    def keyword_case(match):
+        word = match.group(0)
+        if word in bound or word.lower() not in CYPHER_KEYWORDS:
+            return word
+        return word.upper()
+
+    text = _WORD.sub(keyword_case, text)
+
+    def literal_value(item):
+        if item.startswith("\x00"):
+            return literals[int(item.strip("\x00"))]
+        return item
+
+    def sort_in_list(match):
+        # Only membership tests are order-free: lists iterated by
+        # comprehensions, reduce() or any()/all(), indexed or sliced lists
+        # (excluded by _IN_LIST) and lists outside WHERE keep their order.
+        before = match.string[:match.start()]
+        clauses = _CLAUSE.findall(before)
+        if not clauses or clauses[-1] != "WHERE" or _ITERATOR.search(before):
+            return match.group(0)
+        items = [item.strip() for item in match.group(1).split(",")]
+        if not all(_SIMPLE_LITERAL.match(item) for item in items):
+            return match.group(0)
+        return "IN [" + ",".join(sorted(items, key=literal_value)) + "]"
+
+    text = _IN_LIST.sub(sort_in_list, text)
+    return re.sub(r"\x00(\d+)\x00", lambda m: literals[int(m.group(1))], text)
+
+
+class QueryResultCache:
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, query, database=None, variant=None, params=None):
+        params_key = json.dumps(params, sort_keys=True, default=str) if params else None
+        return (database, variant, normalize_query(query), params_key)
+
+    def get(self, query, database=None, variant=None, params=None):
+        key = self.key(query, database, variant, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query, value, database=None, variant=None, size=None, params=None):
+        if size is None:
+            size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        key = self.key(query, database, variant, params)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+class PlanCacheTracker:
+    # Neo4j caches execution plans by exact query text, so a statement whose
+    # text was sent recently is served from the plan cache instead of being
+    # parsed and planned again. This mirrors that cache on the client side
+    # (same LRU size as the server default) to count expected plan-cache hits.
+    def __init__(self, size=DEFAULT_PLAN_CACHE_SIZE):
+        self.size = size
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, query):
+        with self._lock:
+            if query in self._texts:
+                self._texts.move_to_end(query)
+                self.hits += 1
+                return True
+            self._texts[query] = None
+            if len(self._texts) > self.size:
+                self._texts.popitem(last=False)
+            self.misses += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            planned = self.hits + self.misses
+            return {
+                "plan_cache_hits": self.hits,
+                "plan_cache_misses": self.misses,
+                "plan_cache_hit_rate": (self.hits / planned) if planned else 0.0,
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_query_cache(ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+    # The graph only changes on batch loads, so one cache is shared by every
+    # session in the process; call clear() after a load.
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            logger.info(f"Creating query result cache (ttl={ttl_seconds}s, max_bytes={max_bytes})")
+            _shared_cache = QueryResultCache(ttl_seconds, max_bytes)
+        else:
+            _shared_cache.ttl_seconds = ttl_seconds
+            _shared_cache.max_bytes = max_bytes
+    return _shared_cache
+
+
+_plan_tracker = PlanCacheTracker()
+
+
+def get_plan_tracker():
+    return _plan_tracker
@@ -0,0 +1,65 @@
+import json
+
+PRETTY = "pretty"
+MINIFIED = "minified"
+COLUMNAR = "columnar"
+FORMATS = (PRETTY, MINIFIED, COLUMNAR)
+
+# Rough characters-per-token ratio for Gemini on JSON payloads; only used to
+# compare formats against each other, not to budget requests.
+CHARS_PER_TOKEN = 4
+
+
+def jsonable(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [jsonable(item) for item in value]
+    return str(value)
+
+
+def to_columnar(rows):
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    return {
+        "columns": columns,
+        "rows": [[row.get(column) for column in columns] for row in rows],
+    }
+
+
+def encode_results(rows, result_format=PRETTY):
+    # PRETTY is the original indented JSON string. The other formats return
+    # plain JSON-compatible objects so the function response is serialized
+    # once by the Gemini client instead of carrying a JSON string inside JSON.
+    if result_format == PRETTY:
+        return json.dumps(rows, indent=2, default=str)
+    rows = jsonable(rows)
+    if result_format == COLUMNAR:
+        return to_columnar(rows)
+    if result_format == MINIFIED:
+        return rows
+    raise ValueError(f"Unknown result format: {result_format}")
+
+
+def payload_size(payload):
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return len(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def compare_formats(rows, count_tokens=None):
+    # count_tokens can be e.g. a wrapper around client.models.count_tokens for
+    # exact figures; otherwise tokens are estimated from the character count.
+    comparison = []
+    for result_format in FORMATS:
+        payload = {"results": encode_results(rows, result_format)}
+        text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        size = len(text.encode("utf-8"))
+        tokens = count_tokens(text) if count_tokens else -(-len(text) // CHARS_PER_TOKEN)
+        comparison.append({"format": result_format, "bytes": size, "tokens": tokens})
+    return comparison
@@ -0,0 +1,323 @@
+import array
+import base64
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from neo4j_client import read_session
+from text_analysis import stem, terms
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_WIDTH = 160
+# Remembered substring lookups per TermStatistics, cleared when full.
+SUBSTRING_CACHE_SIZE = 4096
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# One search document per searchable node, concatenating the same fields the
+# Step 1 keyword search covers.
+LOAD_QUERY = """
+MATCH (n:Chunk)
+RETURN 'Chunk' AS label, n.id AS id, null AS name, [n.summary] AS texts
+UNION ALL
+MATCH (n:Community)
+RETURN 'Community' AS label, n.id AS id, n.comm_name AS name, [n.comm_name, n.comm_description] AS texts
+UNION ALL
+MATCH (n:SubCommunity)
+RETURN 'SubCommunity' AS label, n.id AS id, n.comm_name AS name,
+       [n.comm_name, n.comm_description] + coalesce(n.keywords, []) + coalesce(n.insights, []) AS texts
+"""
+
+
+def _document_text(texts):
+    return "\n".join(str(text) for text in texts or [] if text)
+
+
+def fetch_documents(driver, database=None, query=LOAD_QUERY):
+    def work(tx):
+        return [
+            {"label": record["label"], "id": record["id"], "name": record["name"], "text": _document_text(record["texts"])}
+            for record in tx.run(query)
+        ]
+
+    with read_session(driver, database) as session:
+        return session.execute_read(work)
+
+
+def _average(lengths):
+    return (sum(lengths) / len(lengths)) if len(lengths) and sum(lengths) else 1.0
+
+
+def _encode_array(values):
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode_array(typecode, encoded):
+    values = array.array(typecode)
+    values.frombytes(base64.b64decode(encoded))
+    return values
+
+
+class InvertedIndex:
+    # Posting lists are arrays of ascending 32-bit document numbers with a
+    # parallel array of 16-bit term frequencies; document metadata lives in
+    # parallel lists indexed by the same numbers.
+    def __init__(self):
+        self.labels = []
+        self.ids = []
+        self.names = []
+        self.texts = []
+        self.lengths = array.array("I")
+        self.postings = {}
+        self.frequencies = {}
+        self.average_length = 1.0
+        self.built_at = None
+
+    @classmethod
+    def build(cls, documents):
+        index = cls()
+        scratch = {}
+        for doc_no, document in enumerate(documents):
+            index.labels.append(document["label"])
+            index.ids.append(document["id"])
+            index.names.append(document.get("name"))
+            index.texts.append(document.get("text") or "")
+            document_terms = terms(document.get("text"))
+            index.lengths.append(len(document_terms))
+            counts = {}
+            for term in document_terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                scratch.setdefault(term, []).append((doc_no, min(count, 0xFFFF)))
+        for term, entries in scratch.items():
+            index.postings[term] = array.array("I", (doc_no for doc_no, _ in entries))
+            index.frequencies[term] = array.array("H", (count for _, count in entries))
+        index.average_length = _average(index.lengths)
+        index.built_at = time.time()
+        logger.info(f"Built inverted index: {len(index)} documents, {len(index.postings)} terms")
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def document_frequency(self, term):
+        return len(self.postings.get(term, ()))
+
+    def idf(self, term):
+        frequency = self.document_frequency(term)
+        if not frequency:
+            return 0.0
+        return math.log(1 + len(self) / frequency)
+
+    def bm25_scores(self, query_terms):
+        scores = {}
+        for term in query_terms:
+            doc_nos = self.postings.get(term)
+            if not doc_nos:
+                continue
+            weight = math.log(1 + (len(self) - len(doc_nos) + 0.5) / (len(doc_nos) + 0.5))
+            for doc_no, count in zip(doc_nos, self.frequencies[term]):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_no] / self.average_length)
+                scores[doc_no] = scores.get(doc_no, 0.0) + weight * count * (BM25_K1 + 1) / (count + norm)
+        return scores
+
+    def search(self, text, limit=20, labels=None):
+        query_terms = list(dict.fromkeys(terms(text)))
+        scores = {}
+        for term in query_terms:
+            weight = self.idf(term)
+            for doc_no in self.postings.get(term, ()):
+                scores[doc_no] = scores.get(doc_no, 0.0) + weight
+        if labels:
+            scores = {doc_no: score for doc_no, score in scores.items() if self.labels[doc_no] in labels}
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self.hit(doc_no, score, query_terms) for doc_no, score in ranked]
+
+    def hit(self, doc_no, score, query_terms=()):
+        return {
+            "label": self.labels[doc_no],
+            "id": self.ids[doc_no],
+            "name": self.names[doc_no],
+            "snippet": self.snippet(doc_no, query_terms),
+            "score": round(score, 4),
+        }
+
+    def snippet(self, doc_no, query_terms, width=SNIPPET_WIDTH):
+        text = self.texts[doc_no]
+        wanted = set(query_terms)
+        start = 0
+        for match in re.finditer(r"[A-Za-z0-9]+", text):
+            if stem(match.group(0).lower()) in wanted:
+                start = max(0, match.start() - width // 4)
+                break
+        snippet = " ".join(text[start:start + width].split())
+        prefix = "..." if start > 0 else ""
+        suffix = "..." if start + width < len(text) else ""
+        return f"{prefix}{snippet}{suffix}"
+
+    def to_snapshot(self):
+        return {
+            "built_at": self.built_at,
+            "labels": self.labels,
+            "ids": self.ids,
+            "names": self.names,
+            "texts": self.texts,
+            "lengths": _encode_array(self.lengths),
+            "postings": {term: _encode_array(doc_nos) for term, doc_nos in self.postings.items()},
+            "frequencies": {term: _encode_array(counts) for term, counts in self.frequencies.items()},
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        index = cls()
+        index.built_at = snapshot.get("built_at")
+        index.labels = snapshot["labels"]
+        index.ids = snapshot["ids"]
+        index.names = snapshot["names"]
+        index.texts = snapshot["texts"]
+        index.lengths = _decode_array("I", snapshot["lengths"])
+        index.postings = {term: _decode_array("I", encoded) for term, encoded in snapshot["postings"].items()}
+        index.frequencies = {term: _decode_array("H", encoded) for term, encoded in snapshot["frequencies"].items()}
+        index.average_length = _average(index.lengths)
+        return index
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as snapshot_file:
+            json.dump(self.to_snapshot(), snapshot_file)
+        logger.info(f"Saved inverted index snapshot to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as snapshot_file:
+            index = cls.from_snapshot(json.load(snapshot_file))
+        logger.info(f"Loaded inverted index snapshot from {path}: {len(index)} documents")
+        return index
+
+
+class TermStatistics:
+    # Document frequency per stemmed term over the same documents as the
+    # inverted index, without posting lists: a term dictionary small enough
+    # to keep for every engine. A term neither in it nor inside any of its
+    # terms cannot be matched by a CONTAINS search.
+    def __init__(self, frequencies=None, document_count=0):
+        self.frequencies = frequencies or {}
+        self.document_count = document_count
+        self.substring_frequencies = {}
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls, documents):
+        frequencies = {}
+        document_count = 0
+        for document in documents:
+            document_count += 1
+            for term in set(terms(document.get("text"))):
+                frequencies[term] = frequencies.get(term, 0) + 1
+        logger.info(f"Built term statistics: {document_count} documents, {len(frequencies)} terms")
+        return cls(frequencies, document_count)
+
+    @classmethod
+    def from_index(cls, index):
+        return cls({term: len(doc_nos) for term, doc_nos in index.postings.items()}, len(index))
+
+    def __len__(self):
+        return self.document_count
+
+    def document_frequency(self, term):
+        return self.frequencies.get(term, 0)
+
+    def substring_frequency(self, term):
+        # Keywords are searched with CONTAINS, so a term that is no whole
+        # token may still match inside a longer one ("commerc" in
+        # "ecommerc"). A scan of the whole dictionary, so only used for terms
+        # missing from it and remembered per term.
+        frequency = self.substring_frequencies.get(term)
+        if frequency is None:
+            frequency = max((count for other, count in self.frequencies.items() if term in other), default=0)
+            if len(self.substring_frequencies) >= SUBSTRING_CACHE_SIZE:
+                self.substring_frequencies.clear()
+            self.substring_frequencies[term] = frequency
+        return frequency
+
+    def idf(self, term):
+        frequency = self.document_frequency(term) or self.substring_frequency(term)
+        if not frequency:
+            return 0.0
+        return math.log(1 + len(self) / frequency)
+
+    def keyword_frequency(self, keyword):
+        # Roughly the documents containing every term of the keyword; 0 means
+        # a search for it cannot match.
+        keyword_terms = terms(keyword)
+        if not keyword_terms:
+            return 0
+        return min(self.document_frequency(term) or self.substring_frequency(term) for term in keyword_terms)
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+_term_statistics = None
+_term_statistics_lock = threading.Lock()
+
+
+def get_search_index():
+    return _search_index
+
+
+def ensure_search_index(driver, database=None, snapshot_path=None):
+    # Loaded once per process: from the snapshot file when there is one,
+    # otherwise straight from Neo4j.
+    global _search_index
+    with _search_index_lock:
+        if _search_index is None:
+            if snapshot_path and os.path.exists(snapshot_path):
+                _search_index = InvertedIndex.load(snapshot_path)
+            else:
+                _search_index = InvertedIndex.build(fetch_documents(driver, database))
+    return _search_index
+
+
+def reload_search_index(driver, database=None, snapshot_path=None):
+    # Rebuilds from Neo4j after a graph refresh and swaps the new index in;
+    # searches running meanwhile keep using the old one.
+    global _search_index
+    index = InvertedIndex.build(fetch_documents(driver, database))
+    if snapshot_path:
+        index.save(snapshot_path)
+    with _search_index_lock:
+        _search_index = index
+    return index
+
+
+def ensure_term_statistics(driver, database=None):
+    # Derived from the inverted index when one is loaded, otherwise built
+    # with one scan of the searchable fields.
+    global _term_statistics
+    with _term_statistics_lock:
+        if _term_statistics is None:
+            index = get_search_index()
+            if index is not None:
+                _term_statistics = TermStatistics.from_index(index)
+            else:
+                _term_statistics = TermStatistics.build(fetch_documents(driver, database))
+    return _term_statistics
+
+
+def reload_term_statistics(driver, database=None):
+    global _term_statistics
+    index = get_search_index()
+    if index is not None:
+        statistics = TermStatistics.from_index(index)
+    else:
+        statistics = TermStatistics.build(fetch_documents(driver, database))
+    with _term_statistics_lock:
+        _term_statistics = statistics
+    return statistics
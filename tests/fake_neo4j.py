@@ -0,0 +1,83 @@
+# A minimal stand-in for the async Neo4j driver: rows(query, params) returns
+# the records of each query as dicts, or raises to make it fail.
+
+
+class FakeRecord(dict):
+    pass
+
+
+class FakeSummary:
+    def __init__(self, plan=None):
+        self.plan = plan
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.read = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read >= len(self.rows):
+            raise StopAsyncIteration
+        self.read += 1
+        return FakeRecord(self.rows[self.read - 1])
+
+    async def consume(self):
+        return FakeSummary()
+
+
+class FakeTransaction:
+    def __init__(self, driver, timeout=None):
+        self.driver = driver
+        self.timeout = timeout
+        self.failed = False
+        self.closed = False
+        driver.transactions.append(self)
+
+    async def run(self, query, params=None):
+        if self.failed:
+            raise RuntimeError("transaction already failed")
+        self.driver.queries.append((query, params or {}))
+        try:
+            result = FakeResult(self.driver.rows(query, params or {}))
+        except Exception:
+            self.failed = True
+            raise
+        self.driver.results.append(result)
+        return result
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute_read(self, work, *args):
+        return await work(FakeTransaction(self.driver), *args)
+
+    async def begin_transaction(self, timeout=None):
+        return FakeTransaction(self.driver, timeout)
+
+
+class FakeDriver:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.results = []
+        self.transactions = []
+        self.sessions = []
+
+    def session(self, **config):
+        self.sessions.append(config)
+        return FakeSession(self)
@@ -0,0 +1,60 @@
+import asyncio
+
+from cost_guard import REJECT, CostGuard
+
+
+def plan(operator, rows, *children, details=""):
+    return {"operatorType": f"{operator}@neo4j", "args": {"EstimatedRows": rows, "Details": details}, "children": list(children)}
+
+
+def test_cheap_plan_is_accepted():
+    verdict = CostGuard(max_estimated_rows=1000).evaluate("MATCH (n:Entity {id: 'x'}) RETURN n", plan("ProduceResults", 1, plan("NodeIndexSeek", 1)))
+    assert not verdict.rejected
+    assert verdict.reasons == []
+
+
+def test_expensive_plan_is_rejected():
+    query = "MATCH (a:Entity), (b:Entity) RETURN a, b"
+    verdict = CostGuard(max_estimated_rows=1000).evaluate(query, plan("ProduceResults", 5000, plan("CartesianProduct", 5000)))
+    assert verdict.rejected
+    assert verdict.max_estimated_rows == 5000
+    assert any("cartesian product" in reason for reason in verdict.reasons)
+
+
+def test_unbounded_variable_length_is_rejected():
+    verdict = CostGuard().evaluate("MATCH (a:Entity {id: 'x'})-[*]-(b) RETURN b LIMIT 5", plan("ProduceResults", 5))
+    assert verdict.rejected
+    assert "unbounded variable-length relationship pattern" in verdict.reasons
+
+
+def test_limited_appends_a_limit_only_when_safe():
+    guard = CostGuard(rewrite_limit=50)
+    assert guard.limited("MATCH (n:Entity) RETURN n;") == "MATCH (n:Entity) RETURN n\nLIMIT 50"
+    assert guard.limited("MATCH (n:Entity) RETURN n LIMIT 10") is None
+    assert guard.limited("MATCH (n:Entity) RETURN n UNION MATCH (n:Chunk) RETURN n") is None
+    assert guard.limited("MATCH (n:Entity) SET n.seen = true") is None
+    assert CostGuard(action=REJECT).limited("MATCH (n:Entity) RETURN n") is None
+
+
+def test_decide_rewrites_with_limit():
+    explained = []
+
+    async def explain(query):
+        explained.append(query)
+        return plan("ProduceResults", 100 if "LIMIT" in query else 50000)
+
+    verdict = asyncio.run(CostGuard(max_estimated_rows=1000, rewrite_limit=100).decide("MATCH (n:Entity) RETURN n", explain))
+    assert not verdict.rejected
+    assert verdict.rewritten
+    assert verdict.query.endswith("LIMIT 100")
+    assert len(explained) == 2
+
+
+def test_decide_rejects_when_limit_does_not_help():
+    async def explain(query):
+        return plan("ProduceResults", 10, plan("CartesianProduct", 50000))
+
+    verdict = asyncio.run(CostGuard(max_estimated_rows=1000).decide("MATCH (a:Entity), (b:Entity) RETURN a, b", explain))
+    assert verdict.rejected
+    assert not verdict.rewritten
+    assert verdict.response()["rejected"]
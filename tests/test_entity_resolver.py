@@ -0,0 +1,68 @@
+import threading
+
+from entity_resolver import EntityResolver, aliases, normalize_name, similarity
+
+
+def test_normalize_name():
+    assert normalize_name("  Moët & Chandon ") == "moet chandon"
+
+
+def test_similarity():
+    assert similarity("Louis Vuitton", "louis vuitton") == 1.0
+    assert similarity("Louis Vuitton", "Hennessy") < 0.2
+
+
+def test_aliases_match_whole_words_only():
+    assert aliases("Service Level Agreement", ["Ice"]) == []
+    assert aliases("Louis Vuitton Malletier", ["Louis Vuitton", "LVMH"]) == ["Louis Vuitton"]
+    assert aliases("Moet Hennessy", ["Moët Hennessy", "Moet Hennesy"]) == ["Moet Hennesy"]
+
+
+def test_resolve_ranks_names_and_aliases():
+    resolver = EntityResolver.build({
+        "e1": ("Louis Vuitton", ("LV Malletier",)),
+        "e2": ("Christian Dior", ()),
+    })
+    matches = resolver.resolve("louis vuiton")
+    assert matches[0]["id"] == "e1"
+    assert "matched_alias" not in matches[0]
+    assert resolver.resolve("LV Malletier")[0] == {"id": "e1", "name": "Louis Vuitton", "score": 1.0, "matched_alias": "LV Malletier"}
+    assert resolver.resolve("zzzz") == []
+
+
+def test_update_patches_changed_and_removed_entities():
+    resolver = EntityResolver.build({"e1": ("Louis Vuitton", ()), "e2": ("Christian Dior", ())})
+    assert resolver.update({"e1": ("Louis Vuitton", ()), "e3": ("Christian Dior Couture", ())}) == 2
+    assert [match["id"] for match in resolver.resolve("Christian Dior")] == ["e3"]
+    assert len(resolver) == 2
+
+
+def test_compaction_keeps_the_lock():
+    resolver = EntityResolver.build({f"e{number}": (f"Maison {number}", ()) for number in range(10)})
+    lock = resolver.lock
+    for version in range(5):
+        resolver.update({f"e{number}": (f"Maison {number} v{version}", ()) for number in range(10)})
+    assert resolver.lock is lock
+    assert resolver.dead < len(resolver.key_texts)
+    assert resolver.resolve("Maison 3 v4")[0]["id"] == "e3"
+
+
+def test_resolve_during_updates():
+    resolver = EntityResolver.build({f"e{number}": (f"Vendor {number}", ()) for number in range(200)})
+    errors = []
+
+    def resolve():
+        try:
+            for _ in range(200):
+                resolver.resolve("Vendor 42")
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=resolve) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for version in range(50):
+        resolver.update({f"e{number}": (f"Vendor {number} {version}", ()) for number in range(200)})
+    for reader in readers:
+        reader.join()
+    assert errors == []
@@ -0,0 +1,43 @@
+import asyncio
+
+from engine import GraphRAGEngine, QuestionContext
+from fake_neo4j import FakeDriver
+from graph_tools import _string_list, expand_neighborhood_statement
+
+
+def neighborhood_rows(query, params):
+    # What the query returns for 200 seeds of 25 entities each: the capped
+    # relationship rows, then the capped entity rows.
+    relationships = [
+        {"kind": "relationship", "item": {"source": f"E{number}", "type": "VENDOR", "target": f"E{number + 1}"}}
+        for number in range(1000)
+    ][:params["max_relationships"]]
+    entities = [
+        {"kind": "entity", "item": {"id": f"e{number}", "name": f"E{number}", "sources": ["s"]}}
+        for number in range(len(params["ids"]) * params["max_entities"])
+    ][:params["max_total_entities"]]
+    return relationships + entities
+
+
+def test_statement_accepts_scalars_and_bounds_entities():
+    _, params = expand_neighborhood_statement(5, rel_types="VENDOR", max_total_entities=50)
+    assert params["ids"] == ["5"]
+    assert params["rel_types"] == ["VENDOR"]
+    assert params["max_total_entities"] == 50
+    assert _string_list(["a", None, " ", 3]) == ["a", "3"]
+
+
+def test_relationships_survive_a_large_seed_set():
+    engine = GraphRAGEngine(
+        "neo4j://localhost", "neo4j", "password", "key",
+        fulltext_search_enabled=False, community_search_enabled=False, entity_cards_enabled=False
+    )
+    driver = FakeDriver(neighborhood_rows)
+    engine.driver = lambda: driver
+    ids = [f"chunk-{number}" for number in range(200)]
+    data = asyncio.run(engine.tool_expand_neighborhood({"ids": ids}, QuestionContext("q")))
+    rows = data["results"]
+    kinds = [row["kind"] for row in rows]
+    assert kinds.count("relationship") == engine.options["max_expanded_relationships"]
+    assert kinds.count("entity") == engine.options["max_expanded_entities"]
+    assert "truncated" not in data
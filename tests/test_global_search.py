@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from global_search import NO_ANSWER, GlobalSearch, batch_reports, format_report, parse_points
+
+REPORTS = [
+    {"id": "s1", "label": "SubCommunity", "name": "Leather suppliers", "description": "Tanneries in Italy.",
+     "insights": ["Two vendors had delays"], "keywords": "leather"},
+    {"id": "c1", "label": "Community", "name": "Logistics", "description": "Shipping and customs."},
+]
+
+
+class FailingModels:
+    async def generate_content(self, **kwargs):
+        raise AssertionError("the model must not be called")
+
+
+class FailingClient:
+    def __init__(self):
+        self.aio = type("Aio", (), {"models": FailingModels()})()
+
+
+def test_format_report():
+    text = format_report(REPORTS[0])
+    assert text.splitlines() == [
+        "[id: s1] SubCommunity Leather suppliers",
+        "Tanneries in Italy.",
+        "Insights: Two vendors had delays",
+        "Keywords: leather",
+    ]
+
+
+def test_batch_reports_respects_the_token_budget_and_order():
+    reports = [{"id": str(number), "description": "x" * 400} for number in range(10)]
+    batches = batch_reports(reports, map_input_tokens=250, report_tokens=600)
+    assert [len(batch) for batch in batches] == [2, 2, 2, 2, 2]
+    assert [report["id"] for batch in batches for report, _ in batch] == [str(number) for number in range(10)]
+
+
+def test_batch_reports_keeps_an_oversized_report_in_its_own_batch():
+    batches = batch_reports([{"id": "big", "description": "x" * 8000}, {"id": "small"}], map_input_tokens=100)
+    assert [[report["id"] for report, _ in batch] for batch in batches] == [["big"], ["small"]]
+    assert batch_reports([]) == []
+
+
+def test_parse_points():
+    text = json.dumps([
+        {"id": "s1", "score": 80, "points": ["Two vendors had delays", " "]},
+        {"id": "c1", "score": 0, "points": ["ignored"]},
+        {"id": "unknown", "score": 90, "points": ["ignored"]},
+        {"id": "c1", "score": "high", "points": ["ignored"]},
+        "not an object",
+    ])
+    assert parse_points(text, REPORTS) == [{"score": 80.0, "point": "Two vendors had delays", "source": "Leather suppliers"}]
+
+
+def test_parse_points_tolerates_bad_responses():
+    assert parse_points("not json", REPORTS) == []
+    assert parse_points(None, REPORTS) == []
+    assert parse_points(json.dumps({"id": "c1", "score": 10, "points": ["p"]}), REPORTS)[0]["source"] == "Logistics"
+
+
+def test_no_points_skip_the_model():
+    searcher = GlobalSearch(FailingClient(), "model")
+    assert asyncio.run(searcher.map("question", [])) == []
+    assert asyncio.run(searcher.reduce("question", [])) == NO_ANSWER
@@ -0,0 +1,19 @@
+from hybrid_search import HashingEmbedder, HybridIndex
+from search_index import InvertedIndex
+
+DOCUMENTS = [
+    {"label": "Chunk", "id": "vendor", "text": "Vendor issues delayed the leather deliveries"},
+    {"label": "Chunk", "id": "marketing", "text": "Unrelated marketing plan"},
+    {"label": "Chunk", "id": "boutiques", "text": "Annual report on boutique openings in Asia"},
+]
+
+
+def test_synonyms_reach_paraphrased_documents():
+    index = HybridIndex(InvertedIndex.build(DOCUMENTS), HashingEmbedder())
+    hits = index.search("supplier problems", limit=3)
+    assert [hit["id"] for hit in hits] == ["vendor"]
+
+
+def test_unrelated_documents_do_not_fill_the_limit():
+    index = HybridIndex(InvertedIndex.build(DOCUMENTS), HashingEmbedder())
+    assert index.search("zzz qqq", limit=3) == []
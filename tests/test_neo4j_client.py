@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from fake_neo4j import FakeDriver, FakeRecord
+from neo4j_client import QueryOptions, ResultCollector, run_cypher_batch_async, run_cypher_query_async
+from result_format import MINIFIED
+
+
+def test_collector_stops_at_the_first_record_past_the_cap():
+    collector = ResultCollector(max_rows=2)
+    assert collector.add(FakeRecord(n=1))
+    assert collector.add(FakeRecord(n=2))
+    assert not collector.add(FakeRecord(n=3))
+    assert collector.rows == [{"n": 1}, {"n": 2}]
+    assert collector.truncation()["remaining_rows"] == 1
+    assert collector.truncation()["remaining_rows_is_lower_bound"]
+
+
+def test_collector_counts_up_to_max_rows_counted():
+    collector = ResultCollector(max_rows=1, max_rows_counted=3)
+    read = 0
+    while collector.add(FakeRecord(n=read)):
+        read += 1
+    assert read == 3
+    assert collector.remaining_rows == 3
+
+
+def test_capped_query_reads_one_record_past_the_cap():
+    driver = FakeDriver(lambda query, params: [{"n": number} for number in range(10000)])
+    options = QueryOptions(result_format=MINIFIED, max_rows=200)
+    data = asyncio.run(run_cypher_query_async("MATCH (n) RETURN n", driver, options=options))
+    assert len(data["results"]) == 200
+    assert data["truncated"]["remaining_rows_is_lower_bound"]
+    assert driver.results[0].read == 201
+    assert driver.sessions[0]["fetch_size"] == 201
+
+
+def test_batch_isolates_a_failing_statement():
+    def rows(query, params):
+        if query == "BAD":
+            raise RuntimeError("syntax error")
+        return [{"query": query}]
+
+    driver = FakeDriver(rows)
+    statements = [("RETURN 1", {}), ("BAD", {}), ("RETURN 2", {})]
+    responses = asyncio.run(run_cypher_batch_async(statements, driver, options=QueryOptions(result_format=MINIFIED)))
+    assert responses[0]["results"] == [{"query": "RETURN 1"}]
+    assert responses[1] == {"error": "syntax error"}
+    assert responses[2]["results"] == [{"query": "RETURN 2"}]
+    # The failed transaction is abandoned; the rest runs in a fresh one.
+    assert len(driver.transactions) == 2
+    assert all(tx.closed for tx in driver.transactions)
+
+
+def test_batch_timeout_grows_with_the_statements_left():
+    def rows(query, params):
+        if query == "SLOW":
+            time.sleep(0.12)
+        return [{"query": query}]
+
+    driver = FakeDriver(rows)
+    statements = [("SLOW", {}), ("RETURN 1", {}), ("RETURN 2", {})]
+    options = QueryOptions(result_format=MINIFIED, timeout=0.05)
+    responses = asyncio.run(run_cypher_batch_async(statements, driver, options=options))
+    assert [response["results"][0]["query"] for response in responses] == ["SLOW", "RETURN 1", "RETURN 2"]
+    # Less than one statement's timeout was left after SLOW, so the last two
+    # ran in a new transaction with their own budget.
+    assert [round(tx.timeout, 2) for tx in driver.transactions] == [0.15, 0.1]
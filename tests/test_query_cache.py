@@ -0,0 +1,48 @@
+from query_cache import QueryResultCache, normalize_query
+
+
+def test_whitespace_and_keyword_case():
+    assert normalize_query("match (n)\n  where n.id = 1\treturn n;") == normalize_query("MATCH (n) WHERE n.id = 1 RETURN n")
+
+
+def test_string_literals_are_untouched():
+    assert normalize_query("MATCH (n) WHERE n.name = 'match  Where' RETURN n").count("'match  Where'") == 1
+    assert normalize_query("MATCH (n) WHERE n.name = 'A' RETURN n") != normalize_query("MATCH (n) WHERE n.name = 'a' RETURN n")
+
+
+def test_where_membership_lists_are_order_free():
+    assert normalize_query("MATCH (n) WHERE n.id IN ['b', 'a'] RETURN n") == normalize_query("MATCH (n) WHERE n.id IN ['a','b'] RETURN n")
+    assert normalize_query("MATCH (n) WHERE n.k IN [3, 1, 2] RETURN n") == normalize_query("MATCH (n) WHERE n.k IN [1, 2, 3] RETURN n")
+
+
+def test_reduce_keeps_list_order():
+    assert normalize_query("RETURN reduce(s = '', x IN ['a', 'b'] | s + x)") != normalize_query("RETURN reduce(s = '', x IN ['b', 'a'] | s + x)")
+    assert normalize_query("MATCH (n) WHERE reduce(s = '', x IN ['a', 'b'] | s + x) = n.k RETURN n") != normalize_query(
+        "MATCH (n) WHERE reduce(s = '', x IN ['b', 'a'] | s + x) = n.k RETURN n"
+    )
+
+
+def test_sliced_and_indexed_lists_keep_order():
+    assert normalize_query("MATCH (n) WHERE n.id IN ['a', 'b'][..1] RETURN n") != normalize_query("MATCH (n) WHERE n.id IN ['b', 'a'][..1] RETURN n")
+    assert normalize_query("MATCH (n) WHERE n.id IN [1, 2][0] RETURN n") != normalize_query("MATCH (n) WHERE n.id IN [2, 1][0] RETURN n")
+
+
+def test_comprehensions_keep_order():
+    assert normalize_query("MATCH (n) WHERE [x IN ['a', 'b'] | x][0] = n.id RETURN n") != normalize_query(
+        "MATCH (n) WHERE [x IN ['b', 'a'] | x][0] = n.id RETURN n"
+    )
+
+
+def test_cache_key_includes_params():
+    cache = QueryResultCache()
+    query = "MATCH (n) WHERE n.id = $id RETURN n"
+    cache.put(query, "[1]", params={"id": 1})
+    assert cache.get(query, params={"id": 1}) == "[1]"
+    assert cache.get(query, params={"id": 2}) is None
+
+
+def test_aliases_and_variables_spelled_like_keywords_keep_their_case():
+    assert normalize_query("MATCH (n) RETURN count(n) AS count") != normalize_query("MATCH (n) RETURN count(n) AS COUNT")
+    assert normalize_query("MATCH (end) RETURN end") != normalize_query("MATCH (END) RETURN END")
+    assert normalize_query("MATCH (all:Entity) RETURN all.name") != normalize_query("MATCH (ALL:Entity) RETURN ALL.name")
+    assert normalize_query("match (n) return count(n) as total") == normalize_query("MATCH (n) RETURN COUNT(n) AS total")
@@ -0,0 +1,48 @@
+import asyncio
+
+from engine import GraphRAGEngine, QuestionContext
+from fake_neo4j import FakeDriver
+
+
+def make_engine(rows):
+    engine = GraphRAGEngine(
+        "neo4j://localhost", "neo4j", "password", "key",
+        cost_guard_enabled=False, cache_enabled=False, fulltext_search_enabled=False,
+        community_search_enabled=False, entity_cards_enabled=False
+    )
+    driver = FakeDriver(rows)
+    engine.driver = lambda: driver
+    return engine
+
+
+def test_each_entry_gets_its_own_response():
+    def rows(query, params):
+        if query == "BAD":
+            raise RuntimeError("syntax error")
+        return [{"query": query, "params": params}]
+
+    engine = make_engine(rows)
+    queries = [
+        {"query": "RETURN 1"},
+        "MATCH (n) RETURN n",
+        {"query": "BAD"},
+        {"query": "RETURN $x", "params": "{\"x\": 2}"},
+        {"query": "RETURN $x", "params": "{"},
+        {"query": " "},
+    ]
+    data = asyncio.run(engine.tool_run_cypher_batch({"queries": queries}, QuestionContext("q")))
+    responses = data["results"]
+    assert responses[0]["results"] == [{"query": "RETURN 1", "params": {}}]
+    assert "object" in responses[1]["error"]
+    assert responses[2] == {"error": "syntax error"}
+    assert responses[3]["results"] == [{"query": "RETURN $x", "params": {"x": 2}}]
+    assert "not valid JSON" in responses[4]["error"]
+    assert responses[5] == {"error": "Empty 'query'."}
+
+
+def test_rejects_malformed_batches():
+    engine = make_engine(lambda query, params: [])
+    context = QuestionContext("q")
+    assert "error" in asyncio.run(engine.tool_run_cypher_batch({"queries": "RETURN 1"}, context))
+    assert "error" in asyncio.run(engine.tool_run_cypher_batch({"queries": []}, context))
+    assert "error" in asyncio.run(engine.tool_run_cypher_batch({"queries": [{"query": "RETURN 1"}] * 21}, context))
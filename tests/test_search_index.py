@@ -0,0 +1,23 @@
+from search_index import TermStatistics
+
+
+def test_keyword_frequency_counts_whole_terms():
+    statistics = TermStatistics.build([{"text": "HS-code for e-commerce shipments"}, {"text": "Vendor quotation"}])
+    assert statistics.keyword_frequency("code") == 1
+    assert statistics.keyword_frequency("commerce") == 1
+    assert statistics.keyword_frequency("quotations") == 1
+    assert statistics.keyword_frequency("leather") == 0
+
+
+def test_keyword_frequency_falls_back_to_substrings():
+    statistics = TermStatistics({"ecommerc": 3, "vendor": 5}, 10)
+    assert statistics.keyword_frequency("commerce") == 3
+    assert statistics.idf("commerc") > 0
+    assert statistics.keyword_frequency("zzz") == 0
+
+
+def test_substring_lookups_are_remembered():
+    statistics = TermStatistics({"ecommerc": 3}, 10)
+    assert statistics.substring_frequency("commerc") == 3
+    statistics.frequencies["xcommerc"] = 7
+    assert statistics.substring_frequency("commerc") == 3
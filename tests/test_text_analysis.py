@@ -0,0 +1,42 @@
+from text_analysis import decompose, expand_terms, fold, stem, terms, tokenize
+
+
+def test_fold():
+    assert fold("  Moët   Hennessy ") == "moet hennessy"
+
+
+def test_tokenize_folds_accented_words():
+    assert tokenize("Moët & Chandon, Château d'Yquem") == ["moet", "chandon", "chateau", "d'yquem"]
+
+
+def test_terms_skip_stop_words():
+    assert terms("Show the claimed rights") == [stem("claimed"), stem("rights")]
+
+
+def test_expand_terms_keeps_typed_and_folded_forms():
+    assert expand_terms("Moët") == {"moet": ["Moët", "moet"]}
+    assert expand_terms("Céline, Château") == {stem("celine"): ["Céline", "celine"], "chateau": ["Château", "chateau"]}
+
+
+def test_expand_terms_drops_short_keywords():
+    expanded = expand_terms("AI in Céline de Paris")
+    assert all(len(keyword) >= 3 for keywords in expanded.values() for keyword in keywords)
+    assert "ai" not in expanded and "de" not in expanded
+
+
+def test_expand_terms_adds_base_forms_and_synonyms():
+    expanded = expand_terms("suppliers claimed")
+    assert expanded[stem("suppliers")] == ["suppliers", "supplier", "vendor"]
+    assert expanded[stem("claimed")] == ["claimed", "claim"]
+
+
+def test_decompose_flattens_in_order():
+    assert decompose("claimed rights and quotation") == ["claimed", "claim", "rights", "right", "quotation", "quote"]
+
+
+def test_terms_include_parts_of_joined_tokens():
+    assert terms("HS-code e-commerce LVMH's") == [stem("hs-code"), "code", stem("e-commerce"), stem("commerce"), "lvmh"]
+
+
+def test_possessives_are_stripped():
+    assert expand_terms("LVMH's") == {"lvmh": ["LVMH's", "lvmh's", "lvmh"]}
@@ -0,0 +1,164 @@
+import re
+import unicodedata
+
+# Tokenization shared by the in-process search indexes and the local keyword
+# decomposition, so a keyword matches exactly the terms that were indexed.
+
+# Runs of letters and digits in any script, joined by ' ’ & . or -. Text is
+# folded before tokenizing, so "Moët" is one token, "moet".
+_TOKEN = re.compile(r"[^\W_]+(?:['’&.-][^\W_]+)*")
+_JOINER = re.compile(r"['’&.-]")
+_POSSESSIVE = ("'s", "’s")
+# Shorter keywords match inside too many unrelated words to be searched.
+MIN_KEYWORD_LENGTH = 3
+
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves give tell show find list please
+""".split())
+
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "iz"), ("fulness", "ful"), ("ousness", "ous"), ("iveness", "ive"),
+    ("ations", ""), ("ation", ""), ("ments", ""), ("ment", ""), ("ings", ""), ("ing", ""),
+    ("ies", "y"), ("ied", "y"), ("ers", ""), ("er", ""), ("ed", ""),
+    ("es", ""), ("s", ""),
+)
+
+
+# Domain synonyms, keyed by stem. Each list holds the surface forms searched
+# in addition to the words of the question itself.
+SYNONYMS = {
+    "quot": ["quote", "quotation"],
+    "claim": ["claim", "claimed"],
+    "vendor": ["vendor", "supplier"],
+    "suppli": ["supplier", "vendor"],
+    "sourc": ["source", "sourcing"],
+    "deliveri": ["delivery", "shipment"],
+    "shipment": ["shipment", "delivery"],
+    "pric": ["price", "pricing"],
+    "cost": ["cost", "price"],
+    "compani": ["company", "organization"],
+    "organiz": ["organization", "company"],
+    "brand": ["brand", "maison"],
+    "issu": ["issue", "problem"],
+    "problem": ["problem", "issue"],
+}
+
+
+def fold(text):
+    # Lowercased, accent-folded and whitespace-collapsed: "  Moët  Hennessy"
+    # -> "moet hennessy".
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN.findall(fold(text))
+
+
+def stem(token):
+    # A light suffix stripper: enough to bring "claimed"/"claims" to "claim"
+    # and "quote"/"quotation" to "quot", without a stemming library.
+    if token.endswith(_POSSESSIVE):
+        token = token[:-2]
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)] + replacement
+            break
+    if len(token) > 3 and token[-1] == token[-2] and token[-1] not in "lsz":
+        token = token[:-1]
+    if len(token) > 4 and token.endswith("e"):
+        token = token[:-1]
+    elif len(token) > 4 and token.endswith("y"):
+        token = token[:-1] + "i"
+    return token
+
+
+def token_parts(token):
+    # The words inside "hs-code", "e-commerce" or "lvmh's" that are long
+    # enough to be searched on their own.
+    if not _JOINER.search(token):
+        return []
+    return [part for part in _JOINER.split(token) if len(part) >= MIN_KEYWORD_LENGTH and part not in STOP_WORDS]
+
+
+def terms(text):
+    # Stems of the non-stop-word tokens, in order of appearance, each
+    # followed by the stems of its hyphen/apostrophe parts, since a CONTAINS
+    # search for "commerce" also matches "e-commerce".
+    found = []
+    for token in tokenize(text):
+        if token in STOP_WORDS:
+            continue
+        found.append(stem(token))
+        found.extend(stem(part) for part in token_parts(token) if stem(part) != found[-1])
+    return found
+
+
+def base_form(token):
+    # A conservative singular/past-tense undo that only yields real words
+    # ("suppliers" -> "supplier", "claimed" -> "claim"); unlike stem() the
+    # result is meant to be searched for, not compared.
+    if token.endswith(_POSSESSIVE):
+        return token[:-2]
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    if len(token) > 5 and token.endswith("ed"):
+        token = token[:-2]
+        return token[:-1] if token[-1] == token[-2] else token
+    return token
+
+
+def expand_terms(text):
+    # Local Step 1 decomposition: {stem: keywords}, in order of appearance.
+    # A term's keywords are the word as typed (case and accents kept, since
+    # CONTAINS is exact), its folded form and base form and the domain
+    # synonyms of its stem. Keywords under MIN_KEYWORD_LENGTH are dropped.
+    expanded = {}
+    for match in _TOKEN.finditer(str(text or "")):
+        word = match.group(0)
+        token = fold(word)
+        if token in STOP_WORDS:
+            continue
+        term = stem(token)
+        for keyword in [word, token, base_form(token)] + SYNONYMS.get(term, []):
+            if len(keyword) < MIN_KEYWORD_LENGTH:
+                continue
+            keywords = expanded.setdefault(term, [])
+            if keyword not in keywords:
+                keywords.append(keyword)
+    return expanded
+
+
+def with_synonyms(text):
+    # "supplier problems" -> "supplier problems vendor issue", for matchers
+    # that only see shared words.
+    extra = []
+    for term in terms(text):
+        for synonym in SYNONYMS.get(term, []):
+            if synonym not in extra:
+                extra.append(synonym)
+    return " ".join([str(text or "")] + extra)
+
+
+def decompose(text):
+    # "claimed rights and quotation" -> ["claimed", "claim", "rights", "right", "quotation", "quote"]
+    keywords = []
+    for term_keywords in expand_terms(text).values():
+        for keyword in term_keywords:
+            if keyword not in keywords:
+                keywords.append(keyword)
+    return keywords
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from neo4j_client import read_session
+from text_analysis import fold
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_MAX_AGE_SECONDS = 3600.0
+SHORT_DESCRIPTION_LENGTH = 160
+
+TYPE_MEMBERS_QUERY = """
+MATCH (t:EntityType)-[:RELATED_TO]->(e:Entity)
+WHERE e.id IS NOT NULL
+RETURN coalesce(t.name, t.id) AS type, e.id AS id, e.name AS name, e.entity_description AS description
+"""
+
+
+def short_description(description, length=SHORT_DESCRIPTION_LENGTH):
+    if not description:
+        return None
+    description = " ".join(str(description).split())
+    if len(description) <= length:
+        return description
+    return description[:length].rsplit(" ", 1)[0] + "..."
+
+
+def fetch_type_members(driver, database=None):
+    def work(tx):
+        return [
+            (record["type"], {
+                "id": record["id"],
+                "name": record["name"],
+                "description": short_description(record["description"]),
+            })
+            for record in tx.run(TYPE_MEMBERS_QUERY)
+        ]
+
+    with read_session(driver, database) as session:
+        return session.execute_read(work)
+
+
+class TypeIndex:
+    # EntityType -> its Entities sorted by id, so Step 3 type lookups are a
+    # dict access plus a slice instead of a traversal of every RELATED_TO edge.
+    def __init__(self, members=None):
+        self.names = {}
+        self.members = {}
+        for type_name, member in members or []:
+            if type_name is None:
+                continue
+            key = fold(type_name)
+            self.names.setdefault(key, type_name)
+            self.members.setdefault(key, {})[member["id"]] = member
+        self.members = {
+            key: [entities[entity_id] for entity_id in sorted(entities, key=str)]
+            for key, entities in self.members.items()
+        }
+        self.built_at = time.time()
+        logger.info(f"Built type index: {len(self.members)} types, {sum(map(len, self.members.values()))} memberships")
+
+    def types(self):
+        return [{"type": self.names[key], "count": len(members)} for key, members in sorted(self.members.items())]
+
+    def page(self, type_name, offset=0, limit=DEFAULT_PAGE_SIZE):
+        # None for an unknown type.
+        members = self.members.get(fold(type_name))
+        if members is None:
+            return None
+        try:
+            offset = max(0, int(offset or 0))
+        except (TypeError, ValueError):
+            offset = 0
+        page = {
+            "type": self.names[fold(type_name)],
+            "total": len(members),
+            "offset": offset,
+            "entities": members[offset:offset + limit],
+        }
+        if offset + limit < len(members):
+            page["next_offset"] = offset + limit
+        return page
+
+    def age(self):
+        return time.time() - self.built_at
+
+
+_type_index = None
+_type_index_lock = threading.Lock()
+_type_index_refreshing = False
+
+
+def get_type_index():
+    return _type_index
+
+
+def reload_type_index(driver, database=None):
+    global _type_index
+    index = TypeIndex(fetch_type_members(driver, database))
+    with _type_index_lock:
+        _type_index = index
+    return index
+
+
+def _refresh_in_background(driver, database):
+    global _type_index_refreshing
+    try:
+        reload_type_index(driver, database)
+    except Exception as e:
+        logger.error(f"Type index refresh failed, keeping the previous one: {e}")
+    finally:
+        with _type_index_lock:
+            _type_index_refreshing = False
+
+
+def ensure_type_index(driver, database=None, max_age=DEFAULT_MAX_AGE_SECONDS):
+    # The first call builds the index; afterwards an index older than
+    # max_age keeps being served while one background thread rebuilds it.
+    global _type_index, _type_index_refreshing
+    with _type_index_lock:
+        if _type_index is None:
+            _type_index = TypeIndex(fetch_type_members(driver, database))
+        elif max_age and _type_index.age() > max_age and not _type_index_refreshing:
+            _type_index_refreshing = True
+            threading.Thread(
+                target=_refresh_in_background, args=(driver, database), name="type-index-refresh", daemon=True
+            ).start()
+        return _type_index